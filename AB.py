@@ -1,6 +1,18 @@
 from string import ascii_lowercase as alphabet
+import json
+import logging
+import mmap
+import multiprocessing
+import os
+import random
+import struct
+import time
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
 
-TOTAL = 5
+TOTAL = 5 # Rows and columns of the board when config.txt cannot be read
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "config.txt")
 MAX = True
 MIN = False
 NEG_INF = float('-inf')
@@ -17,27 +29,191 @@ WEAK_POINTS_ORDER = [ROOK_STRING, BISHOP_STRING, KNIGHT_STRING]
 MOVE_PIECE_ORDER = [QUEEN_STRING, ROOK_STRING, BISHOP_STRING, KNIGHT_STRING, PAWN_STRING, KING_STRING]
 VALUABLE_PIECE_ORDER = [QUEEN_STRING, ROOK_STRING, BISHOP_STRING, KNIGHT_STRING]
 
-def find_col(pos):
-    return ord(pos[0])
+# Piece codes used inside the engine, PIECE_STRINGS[code] is the piece type of the dict format
+PAWN = 0
+KNIGHT = 1
+BISHOP = 2
+ROOK = 3
+QUEEN = 4
+KING = 5
+PIECE_STRINGS = [PAWN_STRING, KNIGHT_STRING, BISHOP_STRING, ROOK_STRING, QUEEN_STRING, KING_STRING]
+PIECE_CODES = {piece_type: code for (code, piece_type) in enumerate(PIECE_STRINGS)}
+PIECE_TYPES = range(len(PIECE_STRINGS))
+# Mailbox value of a square without a piece
+EMPTY = -1
+# Victims in the order captures are tried, most valuable (by Piece.score) first
+CAPTURE_ORDER = [QUEEN, ROOK, KNIGHT, BISHOP, PAWN]
 
-def find_row(pos):
-    return pos[1]
+# Fields of the attack record GameBoard keeps for every piece
+ATTACK_TYPE = 0
+ATTACK_REACH = 1
+ATTACK_THREATS = 2
+ATTACK_VALUE = 3
+ATTACK_MOBILITY = 4
 
-def find_position(row: int, col: int):
-    pos = (chr(col), row)
-    return pos
+# Bound stored with a transposition table entry
+EXACT = 0
+LOWER_BOUND = 1
+UPPER_BOUND = 2
 
-'''
-Returns True iff pos is inside the gameboard
-'''
-def is_valid_position(row: int, col: int):
-    return (row < TOTAL and row >= 0 and col >= 97 and col < 102)
+# Fields of a transposition table entry
+ENTRY_KEY = 0
+ENTRY_DEPTH = 1
+ENTRY_FLAG = 2
+ENTRY_VALUE = 3
+ENTRY_MOVE = 4
+ENTRY_GENERATION = 5
+
+TRANSPOSITION_TABLE_MB = 16
+# Positions the ThreatCache of an Engine holds
+THREAT_CACHE_ENTRIES = 8192
+
+# Default budget of a studentAgent search, in seconds, and the deepest iteration ab() starts
+SEARCH_TIME_LIMIT = 1.0
+MAX_SEARCH_DEPTH = 50
+# The clock and stop requests are checked once every CLOCK_CHECK_INTERVAL nodes
+CLOCK_CHECK_INTERVAL = 256
+# Processes studentAgent searches with, 1 searches in this process
+SEARCH_WORKERS = 1
+# Deepest ply from the root that keeps killer moves
+MAX_PLY = 128
+# Quiescence search skips captures that cannot raise the score to alpha even with the piece they take and a
+# margin, which covers QUIESCENCE_DELTA_THREATS threats on the most valuable piece and QUIESCENCE_DELTA_MOVES moves
+QUIESCENCE_DELTA_THREATS = 4
+QUIESCENCE_DELTA_MOVES = 32
+# Width of the null window of principal variation search, smaller than any difference of two evaluations
+NULL_WINDOW = 1e-6
+# Half width of the first aspiration window around the value of the previous iteration, how much
+# it grows each time the value falls outside, and the half width past which the window is unbounded
+ASPIRATION_WINDOW = 0.5
+ASPIRATION_WIDENING = 4
+ASPIRATION_LIMIT = 32
+# Null-move pruning: a node whose side to move still beats beta after passing, searched to a
+# depth NULL_MOVE_REDUCTION plies shallower, is cut off. Only tried at depth NULL_MOVE_MIN_DEPTH and up
+NULL_MOVE_PRUNING = True
+NULL_MOVE_REDUCTION = 2
+NULL_MOVE_MIN_DEPTH = 3
+# Late move reductions: quiet moves after the first LMR_MIN_MOVES moves of a node at depth
+# LMR_MIN_DEPTH and up are searched LMR_REDUCTION plies shallower, and again at full depth if they beat alpha
+LATE_MOVE_REDUCTIONS = True
+LMR_REDUCTION = 1
+LMR_MIN_MOVES = 3
+LMR_MIN_DEPTH = 3
+# Futility pruning: at depth 1, quiet moves that cannot threaten the King are not searched when the
+# evaluation plus FUTILITY_MARGIN, more than a quiet move changes the threat and mobility scores by, is below alpha.
+# It changes the moves played, so it stays off until match.py shows it does not cost strength
+FUTILITY_PRUNING = False
+FUTILITY_MARGIN = 2
+# Moves without a capture after which the game is drawn
+FIFTY_MOVES = 50
+TABLEBASE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tablebase.bin")
+BOOK_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "book.bin")
 
 '''
-Returns True iff pos can be captured or threatened, not blocked by same color piece
+Returns the subset of the squares in mask that can be captured or threatened, not blocked by same color piece
 '''
-def is_targetable_position(pos: tuple, gameboard: dict, is_black: bool):
-    return (is_black and gameboard[pos][1] == WHITE_STRING) or (not is_black and gameboard[pos][1] != WHITE_STRING)
+def is_targetable_position(mask: int, bitboard, is_black: bool):
+    return mask & ~bitboard.occupancy[is_black]
+
+# Zobrist key for MIN to move, the keys of the pieces are kept per Geometry
+ZOBRIST_MIN_TO_MOVE = random.Random(0).getrandbits(64)
+
+class BitBoard:
+    '''
+    @param board Dictionary of positions to (piece_type, color_string) tuples
+    @param geometry Geometry of the board, the one of config.txt if None
+
+    Stores the position as one integer mask per piece code and color, with a bit
+    per square (see Geometry), the occupancy mask of each color, and a mailbox list
+    of the piece code on every square (EMPTY without a piece).
+    Colors are indexed by is_black, so White is 0 and Black is 1.
+    The Zobrist hash of the pieces is kept up to date by every move.
+    '''
+    __slots__ = ('geometry', 'pieces', 'occupancy', 'squares', 'hash')
+
+    def __init__(self, board: dict = None, geometry = None):
+        self.geometry = geometry if geometry is not None else Geometry.default()
+        self.pieces = ([0] * len(PIECE_TYPES), [0] * len(PIECE_TYPES))
+        self.occupancy = [0, 0]
+        self.squares = [EMPTY] * self.geometry.size
+        self.hash = 0
+        if board is not None:
+            for (pos, piece_info) in board.items():
+                is_black = piece_info[1] != WHITE_STRING
+                piece_type = PIECE_CODES[piece_info[0]]
+                sq = self.geometry.squares[pos]
+                self.pieces[is_black][piece_type] |= 1 << sq
+                self.occupancy[is_black] |= 1 << sq
+                self.squares[sq] = piece_type
+                self.hash ^= self.geometry.zobrist_keys[is_black][piece_type][sq]
+
+    def copy(self):
+        bitboard = BitBoard(None, self.geometry)
+        bitboard.pieces = (list(self.pieces[0]), list(self.pieces[1]))
+        bitboard.occupancy = list(self.occupancy)
+        bitboard.squares = list(self.squares)
+        bitboard.hash = self.hash
+        return bitboard
+
+    def all_occupancy(self):
+        return self.occupancy[0] | self.occupancy[1]
+
+    '''
+    Moves the piece on start to end, removing any enemy piece on end
+    Returns the codes of the moving piece and of the captured piece (None if no capture)
+    '''
+    def move_piece(self, start: int, end: int, is_black: bool):
+        start_bit = 1 << start
+        end_bit = 1 << end
+        enemy = not is_black
+        squares = self.squares
+        captured_type = None
+        if self.occupancy[enemy] & end_bit:
+            captured_type = squares[end]
+            self.pieces[enemy][captured_type] ^= end_bit
+            self.occupancy[enemy] ^= end_bit
+            self.hash ^= self.geometry.zobrist_keys[enemy][captured_type][end]
+        moving_piece_type = squares[start]
+        squares[start] = EMPTY
+        squares[end] = moving_piece_type
+        self.pieces[is_black][moving_piece_type] ^= start_bit | end_bit
+        self.occupancy[is_black] ^= start_bit | end_bit
+        keys = self.geometry.zobrist_keys[is_black][moving_piece_type]
+        self.hash ^= keys[start] ^ keys[end]
+        return moving_piece_type, captured_type
+
+    '''
+    Reverts move_piece, putting the captured piece back on end
+    '''
+    def unmove_piece(self, start: int, end: int, is_black: bool, moving_piece_type: int, captured_type: int):
+        start_bit = 1 << start
+        end_bit = 1 << end
+        self.pieces[is_black][moving_piece_type] ^= start_bit | end_bit
+        self.occupancy[is_black] ^= start_bit | end_bit
+        self.squares[start] = moving_piece_type
+        keys = self.geometry.zobrist_keys[is_black][moving_piece_type]
+        self.hash ^= keys[start] ^ keys[end]
+        if captured_type is None:
+            self.squares[end] = EMPTY
+        else:
+            enemy = not is_black
+            self.pieces[enemy][captured_type] |= end_bit
+            self.occupancy[enemy] |= end_bit
+            self.squares[end] = captured_type
+            self.hash ^= self.geometry.zobrist_keys[enemy][captured_type][end]
+
+    def to_dict(self):
+        positions = self.geometry.positions
+        board = {}
+        for is_black in (False, True):
+            color = "Black" if is_black else WHITE_STRING
+            mask = self.occupancy[is_black]
+            while mask:
+                low_bit = mask & -mask
+                sq = low_bit.bit_length() - 1
+                board[positions[sq]] = (PIECE_STRINGS[self.squares[sq]], color)
+                mask ^= low_bit
+        return board
 
 class Piece:
     white_symbols = {
@@ -81,517 +257,1819 @@ class Piece:
     white_pawn_moveset = [(1, 0)]
     black_pawn_moveset = [(-1, 0)]
     king_moveset = [(-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)]
-    knight_moveset = [(1, 2), (1, -2), (2, 1), (2, -1), (-1, 2), (-1, -2), (-2, 1), (-2, -1)] 
+    knight_moveset = [(1, 2), (1, -2), (2, 1), (2, -1), (-1, 2), (-1, -2), (-2, 1), (-2, -1)]
+    bishop_directions = [(1, 1), (-1, 1), (-1, -1), (1, -1)]
+    rook_directions = [(0, 1), (0, -1), (1, 0), (-1, 0)]
 
-    def calculate_threat(threat_set: set, board: dict, capture_candidates: set, player: bool):
+    '''
+    @param threat_mask Mask of squares threatened by a piece
+    @param is_black Boolean if the piece that is attacking is black or not
+    Returns the threatened_score of the enemy pieces inside threat_mask
+    '''
+    def calculate_threat(threat_mask: int, bitboard: BitBoard, is_black: bool):
         score = 0
-        for pos in threat_set:
-            if pos in board:
-                piece_type = board[pos][0]
-                score += Piece.threatened_score[piece_type]
-                opp_piece_is_white = board[pos][1] == WHITE_STRING
-                if (opp_piece_is_white and player is MIN) or (not opp_piece_is_white and player is MAX):
-                    # This Piece is being threatened
-                    capture_candidates.add(pos)
+        threatened = threat_mask & bitboard.occupancy[not is_black]
+        squares = bitboard.squares
+        while threatened:
+            low_bit = threatened & -threatened
+            score += THREATENED_SCORES[squares[low_bit.bit_length() - 1]]
+            threatened ^= low_bit
         return score
 
     '''
-    @param piece_type The String Piece Type
-    @param current_pos_desc Current Pawn Position (Pawn)
+    @param piece_type The piece code
+    @param sq Current square of the piece
     @param is_black Boolean if the piece that is attacking is black or not
-    
-    Calls the appropriate function
-    '''
-    def assign_threats(piece_type: str, current_pos_desc: tuple, gameboard: dict, is_black: bool):
-        threatened_places = set()
-
-        if piece_type == PAWN_STRING:
-            Piece.pawn_threatens(current_pos_desc, threatened_places, gameboard, is_black)
-        if piece_type == ROOK_STRING or piece_type == QUEEN_STRING:
-            Piece.rook_threatens(current_pos_desc, threatened_places, gameboard, is_black)
-        if piece_type == BISHOP_STRING or piece_type == QUEEN_STRING:
-            Piece.bishop_threatens(current_pos_desc, threatened_places, gameboard, is_black)
-        if piece_type == KNIGHT_STRING:
-            Piece.knight_threatens(current_pos_desc, threatened_places, gameboard, is_black)
-        if piece_type == KING_STRING:
-            Piece.king_threatens(current_pos_desc, threatened_places, gameboard, is_black)
-
-        return threatened_places
-        
-    '''
-    @param pos Position of Pawn e.g. ('a', 1)
-    @param threat_set Set of positions that are threatened by the pawn, is mutated
-    @param gameboard Dictionary of gameboard
+
+    Calls the appropriate function, returns the mask of threatened squares
+    '''
+    def assign_threats(piece_type: int, sq: int, bitboard: BitBoard, is_black: bool):
+        geometry = bitboard.geometry
+        if piece_type == PAWN:
+            return Piece.pawn_threatens(sq, bitboard, is_black)
+        if piece_type == ROOK:
+            return Piece.slider_threatens(geometry.rook_rays[sq], bitboard, is_black)
+        if piece_type == BISHOP:
+            return Piece.slider_threatens(geometry.bishop_rays[sq], bitboard, is_black)
+        if piece_type == QUEEN:
+            return Piece.slider_threatens(geometry.queen_rays[sq], bitboard, is_black)
+        if piece_type == KNIGHT:
+            return is_targetable_position(geometry.knight_masks[sq], bitboard, is_black)
+        if piece_type == KING:
+            return is_targetable_position(geometry.king_masks[sq], bitboard, is_black)
+        return 0
+
+    '''
+    @param sq Square of the Pawn
+    @param bitboard BitBoard of the gameboard
     @param is_black Boolean for whether the pawn is black or white
-    Adds places that pawn threatens to threat_set
-    '''
-    def pawn_threatens(pos: tuple, threat_set: set, gameboard: dict, is_black: bool):
-        current_row = find_row(pos)
-        current_col = find_col(pos)
-
-        # Positions Pawn can capture
-        moveset = Piece.black_pawn_attack_moveset if is_black else Piece.white_pawn_attack_moveset
-        for move in moveset:
-            row = current_row + move[0]
-            col = current_col + move[1]
-            pos = find_position(row, col)
-            if is_valid_position(row, col) and (pos in gameboard and is_targetable_position(pos, gameboard, is_black)):
-                threat_set.add(pos)
-
-        # Positions Pawn can move to
-        moveset = Piece.black_pawn_moveset if is_black else Piece.white_pawn_moveset
-        for move in moveset:
-            row = current_row + move[0]
-            col = current_col + move[1]
-            pos = find_position(row, col)
-            if is_valid_position(row, col) and (pos not in gameboard):
-                threat_set.add(pos)
-
-    '''
-    @param pos Position of King
-    returns number of pieces the King threatens
-    '''
-    def king_threatens(pos: tuple, threat_set: set, gameboard: dict, is_black: bool):
-        current_row = find_row(pos)
-        current_col = find_col(pos)
-
-        for move in Piece.king_moveset:
-            row = current_row + move[0]
-            col = current_col + move[1]
-            pos = find_position(row, col)
-            if is_valid_position(row, col) and (pos not in gameboard or (pos in gameboard and is_targetable_position(pos, gameboard, is_black))):
-                threat_set.add(pos)
-    '''
-    @param pos Position of Knight
-    returns number of pieces the Knight threatens
-    '''
-    def knight_threatens(current_pos: tuple, threat_set: set, gameboard: dict, is_black: bool):
-        current_row = find_row(current_pos)
-        current_col = find_col(current_pos)
-
-        for move in Piece.knight_moveset:
-            row = current_row + move[0]
-            col = current_col + move[1]
-            pos = find_position(row, col)
-            if is_valid_position(row, col) and (pos not in gameboard or (pos in gameboard and is_targetable_position(pos, gameboard, is_black))):
-                threat_set.add(pos)
-
-    '''
-    @param pos
-    returns number of pieces the Bishop threatens
-    '''
-    def bishop_threatens(pos: tuple, threat_set: set, gameboard: dict, is_black: bool):
-        current_row = find_row(pos)
-        current_col = find_col(pos)
-
-        min_end = TOTAL
-        
-        # Left-to-right diagonal from piece
-        for i in range(1, min_end):
-            row_i = current_row + i
-            col_i = current_col + i
-            pos = find_position(row_i, col_i)
-            if not is_valid_position(row_i, col_i):
-                break
-            if pos in gameboard:
-                if is_targetable_position(pos, gameboard, is_black):
-                    threat_set.add(pos)
-                break
-            else:
-                threat_set.add(pos)
-
-        # right-to-left diagonal from piece
-        for i in range(1, min_end):
-            row_i = current_row - i
-            col_i = current_col + i
-            pos = find_position(row_i, col_i)
-            if not is_valid_position(row_i, col_i):
-                break
-            if pos in gameboard:
-                if is_targetable_position(pos, gameboard, is_black):
-                    threat_set.add(pos)
-                break
-            else:
-                threat_set.add(pos)
-            
-        # Left-to-right diagonal before piece
-        for i in range(1, min_end):
-            row_i = current_row - i
-            col_i = current_col - i
-            pos = find_position(row_i, col_i)
-            if not is_valid_position(row_i, col_i):
-                break
-            if pos in gameboard:
-                if is_targetable_position(pos, gameboard, is_black):
-                    threat_set.add(pos)
-                break
-            else:
-                threat_set.add(pos)
-        
-        # right-to-left diagonal from piece
-        for i in range(1, min_end):
-            row_i = current_row + i
-            col_i = current_col - i
-            pos = find_position(row_i, col_i)
-            if not is_valid_position(row_i, col_i):
-                break
-            if pos in gameboard:
-                if is_targetable_position(pos, gameboard, is_black):
-                    threat_set.add(pos)
-                break
-            else:
-                threat_set.add(pos)
+    Returns the mask of places that pawn threatens: enemy pieces it can capture and the empty square ahead
+    '''
+    def pawn_threatens(sq: int, bitboard: BitBoard, is_black: bool):
+        geometry = bitboard.geometry
+        return (geometry.pawn_capture_masks[is_black][sq] & bitboard.occupancy[not is_black]) \
+            | (geometry.pawn_push_masks[is_black][sq] & ~bitboard.all_occupancy())
 
     '''
-    @param pos
-    returns moves a Rook can do from pos
+    @param rays The (ray mask, square bits in order) rays of a Rook, Bishop or Queen
+    Returns the mask of places the piece threatens, each ray stops at the first piece it meets
     '''
-    def rook_threatens(pos: tuple, threat_set: set, gameboard: dict, is_black: bool):
-        current_row = find_row(pos)
-        current_col = find_col(pos)
+    def slider_threatens(rays: tuple, bitboard: BitBoard, is_black: bool):
+        occupied = bitboard.all_occupancy()
+        reach_mask = 0
 
-        for column in range(current_col + 1, TOTAL):
-            #Same row all columns part of Rook's moves
-            if not is_valid_position(current_row, column):
-                break
-            pos = find_position(current_row, column)
-            if pos in gameboard:
-                if is_targetable_position(pos, gameboard, is_black):
-                    threat_set.add(pos)
-                break
-            else:
-                threat_set.add(pos)
-
-        for column in range(current_col - 1, -1, -1):
-            #Same row all columns part of Rook's moves
-            if not is_valid_position(current_row, column):
-                break
-            pos = find_position(current_row, column)
-            if pos in gameboard:
-                if is_targetable_position(pos, gameboard, is_black):
-                    threat_set.add(pos)
-                break
-            else:
-                threat_set.add(pos)
-
-        for row in range(current_row + 1, TOTAL):
-            #Same column all rows part of Rook's moves
-            if not is_valid_position(row, current_col):
-                break
-            pos = find_position(row, current_col)
-            if pos in gameboard:
-                if is_targetable_position(pos, gameboard, is_black):
-                    threat_set.add(pos)
-                break
-            else:
-                threat_set.add(pos)
-
-        for row in range(current_row - 1, -1, -1):
-            #Same column all rows part of Rook's moves
-            if not is_valid_position(row, current_col):
-                break
-            pos = find_position(row, current_col)
-            if pos in gameboard:
-                if is_targetable_position(pos, gameboard, is_black):
-                    threat_set.add(pos)
-                break
-            else:
-                threat_set.add(pos)
-
-    def is_checkmate(king_pos: tuple, enemy_threats: dict):
-        # Check King Moveset for intersection with enemy_threats
-        current_row = find_row(king_pos)
-        current_col = find_col(king_pos)
-        king_checkmate = True #Assume True, if its False we'll find out
-        
-        for move in Piece.king_moveset:
-            row = current_row + move[0]
-            col = current_col + move[1]
-            if not is_valid_position(row, col):
-                continue # Cannot escape with this move
-            else:
-                pos = find_position(row, col)
-                if pos not in enemy_threats:
-                    king_checkmate = False
+        for (ray_mask, ray) in rays:
+            if not ray_mask & occupied:
+                reach_mask |= ray_mask
+                continue
+            for bit in ray:
+                reach_mask |= bit
+                if occupied & bit:
                     break
-        king_check = king_pos in enemy_threats
 
-        return king_check and king_checkmate
-    
-    def moves_threatening_king(our_threats: dict, enemy_weak_points: dict, our_pieces: dict, moves_added: set):
-        moves = []
-        for piece in VALUABLE_PIECE_ORDER:
-            if piece not in our_pieces: # We can't do anything anyways
-                continue
-            # Common points that piece can move to, in order to threaten enemy King
-            attacking_points = our_threats.keys() & enemy_weak_points[piece]
-            
-            for point in attacking_points:
-                piece_pos = our_pieces[piece]
-                # If this piece's position is inside the set of all positions from which we can move to point from
-                if piece_pos in our_threats[point] and (piece_pos, point) not in moves_added:
-                    move = (piece_pos, point)
-                    moves.append(move)
-                    moves_added.add(move)
+        return is_targetable_position(reach_mask, bitboard, is_black)
 
-        return moves
+    def is_checkmate(king_sq: int, enemy_threat_mask: int, geometry):
+        # King is threatened and every square it could escape to is threatened
+        king_check = enemy_threat_mask & (1 << king_sq)
+        king_checkmate = not (geometry.king_masks[king_sq] & ~enemy_threat_mask)
 
-    def moves_attacking_king(king_pos: tuple, our_threats: dict, moves_added: set):
-        # Check King Moveset for intersection with enemy_threats
-        current_row = find_row(king_pos)
-        current_col = find_col(king_pos)
-        moves = []
+        return bool(king_check) and king_checkmate
 
-        if king_pos in our_threats:
-            # Pick some element from set and add move to capture King
-            start_points = our_threats[king_pos]
-            for start_pos in start_points:
-                move = (start_pos, king_pos)
-                if move not in moves_added:
-                    moves.append(move)
-                    moves_added.add(move)
-        
-        for move in Piece.king_moveset:
-            row = current_row + move[0]
-            col = current_col + move[1]
-            if not is_valid_position(row, col):
-                continue # Cannot escape with this move
-            else:
-                pos = find_position(row, col)
-                if pos in our_threats:
-                    start_points = our_threats[pos]
-                    for start_pos in start_points:
-                        move = (start_pos, pos)
-                        if move not in moves_added:
-                            moves.append(move)
-                            moves_added.add(move)
+    '''
+    @param targets Mask of target squares
+    @param our_attacks Dictionary of start square to the attack record of our piece there
+    Returns all moves from our pieces onto a square in targets
+    '''
+    def moves_onto(targets: int, our_attacks: dict):
+        moves = []
+        for (start_sq, record) in our_attacks.items():
+            hits = record[ATTACK_THREATS] & targets
+            while hits:
+                low_bit = hits & -hits
+                moves.append((start_sq, low_bit.bit_length() - 1))
+                hits ^= low_bit
         return moves
 
-    def moves_attacking_others(capture_candidates: set, enemy_pieces: dict, our_threats: dict, moves_added: set):
+    def moves_attacking_king(king_mask: int, our_attacks: dict, targets_added: int, geometry):
+        # Capture the King first, then the squares it could escape to
+        king_zone = geometry.king_masks[king_mask.bit_length() - 1]
+        moves = Piece.moves_onto(king_mask & ~targets_added, our_attacks)
+        moves.extend(Piece.moves_onto(king_zone & ~targets_added, our_attacks))
+        return moves, targets_added | king_mask | king_zone
+
+    '''
+    Returns the captures in MVV-LVA order: most valuable victim first, and each victim
+    taken by its least valuable attacker first
+    '''
+    def moves_attacking_others(capture_candidates: int, enemy_pieces: list, our_attacks: dict, targets_added: int):
         moves = []
-        for piece in VALUABLE_PIECE_ORDER:
+        for piece in CAPTURE_ORDER:
             # If it's a piece that exists and it is a piece that can be captured
-            if piece in enemy_pieces and enemy_pieces[piece] in capture_candidates:
-                piece_to_capture_pos = enemy_pieces[piece]
-                start_points = our_threats[piece_to_capture_pos]
-                for start_pos in start_points:
-                    move = (start_pos, piece_to_capture_pos)
-                    if move not in moves_added:
-                        moves.append(move)
-                        moves_added.add(move)
-        if PAWN_STRING in enemy_pieces:
-            for pos in enemy_pieces[PAWN_STRING]:
-                if pos in capture_candidates:
-                    start_points = our_threats[pos]
-                    for start_pos in start_points:
-                        move = (start_pos, pos)
-                        if move not in moves_added:
-                            moves.append(move)
-                            moves_added.add(move)
-        return moves
+            targets = enemy_pieces[piece] & capture_candidates & ~targets_added
+            if targets:
+                captures = Piece.moves_onto(targets, our_attacks)
+                if len(captures) > 1:
+                    captures.sort(key=lambda move: PIECE_SCORES[our_attacks[move[0]][ATTACK_TYPE]])
+                moves.extend(captures)
+                targets_added |= targets
+        return moves, targets_added
 
-    def all_moves(our_threats: dict, moves_added: set):
-        moves = []
-        for end_point in our_threats.keys():
-            set_of_start_points = our_threats[end_point]
-            for start_point in set_of_start_points:
-                move = (start_point, end_point)
-                if move not in moves_added:
-                    moves.append(move)
-                    moves_added.add(move)
-        return moves
+    def all_moves(our_attacks: dict, targets_added: int):
+        return Piece.moves_onto(~targets_added, our_attacks)
+
+# Piece.score and Piece.threatened_score indexed by piece code
+PIECE_SCORES = [Piece.score[piece_type] for piece_type in PIECE_STRINGS]
+THREATENED_SCORES = [Piece.threatened_score[piece_type] for piece_type in PIECE_STRINGS]
+
+class Geometry:
+    '''
+    @param rows Number of rows of the board
+    @param cols Number of columns of the board
+
+    Square numbering and move tables of one board size, get them with Geometry.of.
+    Square sq is on row sq // cols and column sq % cols, and is bit 1 << sq of a mask.
+    '''
+    instances = {}
+
+    def __init__(self, rows: int, cols: int):
+        self.rows = rows
+        self.cols = cols
+        self.size = rows * cols
+        self.positions = [(alphabet[sq % cols], sq // cols) for sq in range(self.size)]
+        self.squares = {pos: sq for (sq, pos) in enumerate(self.positions)}
+
+        # Squares a King or Knight moves to, and where a Pawn of each color moves or captures
+        self.king_targets = [self.targets(sq, Piece.king_moveset) for sq in range(self.size)]
+        self.knight_targets = [self.targets(sq, Piece.knight_moveset) for sq in range(self.size)]
+        self.pawn_push_targets = tuple([self.targets(sq, moveset) for sq in range(self.size)]
+                                       for moveset in (Piece.white_pawn_moveset, Piece.black_pawn_moveset))
+        self.pawn_capture_targets = tuple([self.targets(sq, moveset) for sq in range(self.size)]
+                                          for moveset in (Piece.white_pawn_attack_moveset, Piece.black_pawn_attack_moveset))
+        self.king_masks = [Geometry.mask(targets) for targets in self.king_targets]
+        self.knight_masks = [Geometry.mask(targets) for targets in self.knight_targets]
+        self.pawn_push_masks = tuple([Geometry.mask(targets) for targets in pawn_targets] for pawn_targets in self.pawn_push_targets)
+        self.pawn_capture_masks = tuple([Geometry.mask(targets) for targets in pawn_targets] for pawn_targets in self.pawn_capture_targets)
+
+        # Rays of each slider, as (ray mask, square bits ordered away from sq)
+        self.rook_rays = [self.rays(sq, Piece.rook_directions) for sq in range(self.size)]
+        self.bishop_rays = [self.rays(sq, Piece.bishop_directions) for sq in range(self.size)]
+        self.queen_rays = [self.rook_rays[sq] + self.bishop_rays[sq] for sq in range(self.size)]
+
+        # Zobrist keys, one per color, piece type and square, seeded by the board size so that
+        # positions of two geometries with as many squares do not share keys
+        zobrist_random = random.Random("%dx%d" % (rows, cols))
+        self.zobrist_keys = tuple(Geometry.by_code({piece_type: [zobrist_random.getrandbits(64) for sq in range(self.size)] for piece_type in MOVE_PIECE_ORDER})
+                                  for is_black in (False, True))
+
+        # Every square the piece on sq could threaten on some board
+        self.reach_masks = tuple(Geometry.by_code({
+            KING_STRING: self.king_masks,
+            KNIGHT_STRING: self.knight_masks,
+            PAWN_STRING: [self.pawn_push_masks[is_black][sq] | self.pawn_capture_masks[is_black][sq] for sq in range(self.size)],
+            ROOK_STRING: [Geometry.rays_mask(rays) for rays in self.rook_rays],
+            BISHOP_STRING: [Geometry.rays_mask(rays) for rays in self.bishop_rays],
+            QUEEN_STRING: [Geometry.rays_mask(rays) for rays in self.queen_rays]
+        }) for is_black in (False, True))
+
+    '''
+    Returns the Geometry of a rows x cols board, it is only built the first time
+    '''
+    def of(rows: int, cols: int):
+        if (rows, cols) not in Geometry.instances:
+            Geometry.instances[(rows, cols)] = Geometry(rows, cols)
+        return Geometry.instances[(rows, cols)]
+
+    default_instance = None
+    # Starting position declared in config.txt, read along with default_instance
+    default_board = None
+
+    '''
+    Returns the Geometry of the board declared in config.txt, or of a TOTAL x TOTAL board with
+    DEFAULT_STARTING_PIECES if there is no config.txt or it cannot be read
+    '''
+    def default():
+        if Geometry.default_instance is None:
+            try:
+                Geometry.default_instance, Geometry.default_board = load_config()
+            except (OSError, ValueError):
+                Geometry.default_instance, Geometry.default_board = Geometry.of(TOTAL, TOTAL), DEFAULT_STARTING_PIECES
+        return Geometry.default_instance
+
+    def is_on_board(self, row: int, col: int):
+        return row >= 0 and row < self.rows and col >= 0 and col < self.cols
+
+    def targets(self, sq: int, moveset: list):
+        row = sq // self.cols
+        col = sq % self.cols
+        return tuple((row + move[0]) * self.cols + col + move[1] for move in moveset if self.is_on_board(row + move[0], col + move[1]))
+
+    def rays(self, sq: int, directions: list):
+        rays = []
+        for direction in directions:
+            row = sq // self.cols + direction[0]
+            col = sq % self.cols + direction[1]
+            ray = []
+            while self.is_on_board(row, col):
+                ray.append(1 << (row * self.cols + col))
+                row += direction[0]
+                col += direction[1]
+            if ray:
+                rays.append((Geometry.mask_of_bits(ray), tuple(ray)))
+        return tuple(rays)
+
+    def mask(squares: tuple):
+        mask = 0
+        for sq in squares:
+            mask |= 1 << sq
+        return mask
+
+    def mask_of_bits(bits: list):
+        mask = 0
+        for bit in bits:
+            mask |= bit
+        return mask
+
+    def rays_mask(rays: tuple):
+        return Geometry.mask_of_bits([ray_mask for (ray_mask, ray) in rays])
+
+    '''
+    Returns the values of a dictionary keyed by piece type as a list indexed by piece code
+    '''
+    def by_code(table: dict):
+        return [table[piece_type] for piece_type in PIECE_STRINGS]
+
+'''
+@param path Path of a config file in the format of config.txt
+
+Returns the Geometry of the board and the dictionary of the starting position the config declares.
+Enemy pieces are Black, own pieces are White
+'''
+def load_config(path: str = CONFIG_PATH):
+    rows = None
+    cols = None
+    board = {}
+    counts = {}
+    color = None
+    with open(path) as config:
+        for line in config:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith("Rows:"):
+                rows = int(line[len("Rows:"):])
+            elif line.startswith("Cols:"):
+                cols = int(line[len("Cols:"):])
+            elif line.startswith("Number of Enemy") or line.startswith("Number of Own"):
+                color = "Black" if line.startswith("Number of Enemy") else WHITE_STRING
+                # King, Queen, Bishop, Rook, Knight, Pawn
+                numbers = [int(number) for number in line.split(":")[-1].split()]
+                counts[color] = dict(zip([KING_STRING, QUEEN_STRING, BISHOP_STRING, ROOK_STRING, KNIGHT_STRING, PAWN_STRING], numbers))
+            elif line.startswith("Position of Enemy"):
+                color = "Black"
+            elif line.startswith("Starting Position"):
+                color = WHITE_STRING
+            elif line.startswith("["):
+                piece_type, pos = [part.strip() for part in line.strip("[]").split(",")]
+                if color is None or piece_type not in Piece.score:
+                    raise ValueError("Unexpected piece in %s: %s" % (path, line))
+                board[(pos[0], int(pos[1:]))] = (piece_type, color)
+            else:
+                raise ValueError("Unexpected line in %s: %s" % (path, line))
+
+    if rows is None or cols is None:
+        raise ValueError("%s does not declare Rows and Cols" % path)
+    geometry = Geometry.of(rows, cols)
+    for (pos, piece_info) in board.items():
+        if pos not in geometry.squares:
+            raise ValueError("%s places a %s outside the %d x %d board" % (path, piece_info[0], rows, cols))
+    for (color, color_counts) in counts.items():
+        for (piece_type, count) in color_counts.items():
+            if count != sum(1 for piece_info in board.values() if piece_info == (piece_type, color)):
+                raise ValueError("%s declares %d %s %s pieces but places a different number" % (path, count, color, piece_type))
+    return geometry, board
+
+# Starting position of a TOTAL x TOTAL board, played when config.txt cannot be read
+DEFAULT_STARTING_PIECES = {
+        ("e", 4) : (KING_STRING, "Black"),
+        ("d", 4): (QUEEN_STRING, "Black"),
+        ("c", 4): (BISHOP_STRING, "Black"),
+        ("b", 4): (KNIGHT_STRING, "Black"),
+        ("a", 4): (ROOK_STRING, "Black"),
+        ("a", 3): (PAWN_STRING, "Black"),
+        ("b", 3): (PAWN_STRING, "Black"),
+        ("c", 3): (PAWN_STRING, "Black"),
+        ("d", 3): (PAWN_STRING, "Black"),
+        ("e", 3): (PAWN_STRING, "Black"),
+        ("e", 0) : (KING_STRING, WHITE_STRING),
+        ("d", 0): (QUEEN_STRING, WHITE_STRING),
+        ("c", 0): (BISHOP_STRING, WHITE_STRING),
+        ("b", 0): (KNIGHT_STRING, WHITE_STRING),
+        ("a", 0): (ROOK_STRING, WHITE_STRING),
+        ("a", 1): (PAWN_STRING, WHITE_STRING),
+        ("b", 1): (PAWN_STRING, WHITE_STRING),
+        ("c", 1): (PAWN_STRING, WHITE_STRING),
+        ("d", 1): (PAWN_STRING, WHITE_STRING),
+        ("e", 1): (PAWN_STRING, WHITE_STRING)
+    }
+
+class EvaluationWeights:
+    '''
+    @param material Weight of the piece score, Piece.score of White's pieces minus Black's
+    @param threat Weight of the threat score, Piece.threatened_score of the pieces White threatens minus Black's
+    @param mobility Weight of the number of moves of White minus the number of moves of Black
+    @param win Value of a win state, a loss is -win
+    @param draw Value of a draw state
+
+    Weights of the terms GameBoard.evaluation adds up. The terms themselves are kept
+    up to date by GameBoard.make_move, so changing the weights costs nothing per node
+    '''
+    def __init__(self, material: float = 1, threat: float = 0.1, mobility: float = 0.05, win: float = 400, draw: float = 0):
+        self.material = material
+        self.threat = threat
+        self.mobility = mobility
+        self.win = win
+        self.draw = draw
+
+    '''
+    Returns how much more than the piece it takes a capture can add to the threat and mobility terms,
+    counting the threats of the captured and the capturing piece and of the lines through the squares they leave
+    '''
+    def delta_margin(self):
+        return abs(self.threat) * QUIESCENCE_DELTA_THREATS * max(THREATENED_SCORES) + abs(self.mobility) * QUIESCENCE_DELTA_MOVES
+
+DEFAULT_WEIGHTS = EvaluationWeights()
+
+class ThreatCache:
+    '''
+    @param capacity Number of positions kept, the least recently used is dropped first
+
+    Maps the Zobrist hash of a position to what GameBoard works out from its pieces: the attack
+    records of both colors, the threat and capture masks and the piece, threat and mobility
+    scores. Entries are tuples, so a GameBoard that loads one copies the records into its own
+    dictionaries and never changes the cache. The occupancy of the position is kept with the
+    entry, so two positions with the same hash are told apart.
+    '''
+    def __init__(self, capacity: int = THREAT_CACHE_ENTRIES):
+        self.capacity = capacity
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    '''
+    Returns the entry of the position on bitboard, or None
+    '''
+    def get(self, bitboard: BitBoard):
+        entry = self.entries.get(bitboard.hash)
+        if entry is None or entry[0] != bitboard.occupancy[False] or entry[1] != bitboard.occupancy[True]:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(bitboard.hash)
+        self.hits += 1
+        return entry
+
+    def put(self, key: int, entry: tuple):
+        entries = self.entries
+        if key in entries:
+            entries.move_to_end(key)
+        entries[key] = entry
+        if len(entries) > self.capacity:
+            entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def hit_rate(self):
+        return self.hits / (self.hits + self.misses) if self.hits + self.misses else 0
 
 class GameBoard:
-    n = TOTAL
-    
-    def __init__(self, board: dict):
-        self.rows = TOTAL
-        self.cols = TOTAL
-        self.board = board
-        self.black_pieces = {PAWN_STRING: []}
-        self.white_pieces = {PAWN_STRING: []}
-        self.min_threats = {}
-        self.max_threats = {}
-        self.black_capture_candidates = set()
-        self.white_capture_candidates = set()
+    __slots__ = ('bitboard', 'rows', 'cols', 'weights', 'attacks', 'max_attacks', 'min_attacks',
+                 'piece_score', 'threat_score', 'mobility_score', 'checkmate', 'history',
+                 'max_threat_mask', 'min_threat_mask', 'black_capture_mask', 'white_capture_mask', 'is_terminal_game',
+                 'threat_cache')
+
+    '''
+    @param board Dictionary of gameboard, or the BitBoard backing it
+    @param weights EvaluationWeights of evaluation, DEFAULT_WEIGHTS if None
+    @param threat_cache ThreatCache the attack records of this board and of the positions make_move reaches
+                        are looked up in and stored to, or None to always work them out
+    '''
+    def __init__(self, board, weights: EvaluationWeights = None, threat_cache: ThreatCache = None):
+        self.bitboard = board if isinstance(board, BitBoard) else BitBoard(board)
+        self.rows = self.bitboard.geometry.rows
+        self.cols = self.bitboard.geometry.cols
+        self.weights = weights if weights is not None else DEFAULT_WEIGHTS
+        self.threat_cache = threat_cache
+        # 1 if the Black King is checkmated, -1 if the White King is, 0 if neither, None until evaluated
+        self.checkmate = None
+        self.history = []
+        self.is_terminal_game = not self.bitboard.pieces[False][KING] or not self.bitboard.pieces[True][KING]
+
+        entry = None if threat_cache is None else threat_cache.get(self.bitboard)
+        if entry is not None:
+            self.load_threats(entry)
+            return
+        # Attack record of every piece, by color then square
+        self.attacks = ({}, {})
+        self.max_attacks = self.attacks[False]
+        self.min_attacks = self.attacks[True]
         self.piece_score = 0
         self.threat_score = 0
-        
-        for (pos, piece_info) in board.items():
-            piece_type = piece_info[0]
-            piece_color = piece_info[1]
-            if piece_color == WHITE_STRING:
-                if piece_type == PAWN_STRING:
-                    self.white_pieces[piece_type].append(pos)
-                else:
-                    self.white_pieces[piece_type] = pos
-                self.piece_score += Piece.score[piece_type]
-                threat_set = Piece.assign_threats(piece_type, pos, board, False)
-                self.threat_score += Piece.calculate_threat(threat_set, board, self.black_capture_candidates, MAX)
-                self.update_pieces_with_threats(MAX, threat_set, pos)
+        self.mobility_score = 0
+        for is_black in (False, True):
+            sign = -1 if is_black else 1
+            mask = self.bitboard.occupancy[is_black]
+            while mask:
+                low_bit = mask & -mask
+                sq = low_bit.bit_length() - 1
+                mask ^= low_bit
+                piece_type = self.bitboard.squares[sq]
+                self.piece_score += sign * PIECE_SCORES[piece_type]
+                record = GameBoard.attack_record(piece_type, sq, self.bitboard, is_black)
+                self.attacks[is_black][sq] = record
+                self.threat_score += sign * record[ATTACK_VALUE]
+                self.mobility_score += sign * record[ATTACK_MOBILITY]
+
+        self.update_threat_masks()
+        if threat_cache is not None:
+            threat_cache.put(self.bitboard.hash, self.threats_entry())
+
+    '''
+    Returns the (piece type, reach mask, threat mask, threat score, number of moves) record of the piece on sq
+    '''
+    def attack_record(piece_type: int, sq: int, bitboard: BitBoard, is_black: bool):
+        threat_mask = Piece.assign_threats(piece_type, sq, bitboard, is_black)
+        return (piece_type, bitboard.geometry.reach_masks[is_black][piece_type][sq], threat_mask,
+                Piece.calculate_threat(threat_mask, bitboard, is_black), threat_mask.bit_count())
+
+    def update_threat_masks(self):
+        self.max_threat_mask = 0
+        self.min_threat_mask = 0
+        for record in self.max_attacks.values():
+            self.max_threat_mask |= record[ATTACK_THREATS]
+        for record in self.min_attacks.values():
+            self.min_threat_mask |= record[ATTACK_THREATS]
+        self.black_capture_mask = self.max_threat_mask & self.bitboard.occupancy[True]
+        self.white_capture_mask = self.min_threat_mask & self.bitboard.occupancy[False]
+
+    '''
+    Returns the ThreatCache entry of this position
+    '''
+    def threats_entry(self):
+        occupancy = self.bitboard.occupancy
+        return (occupancy[False], occupancy[True], tuple(self.max_attacks.items()), tuple(self.min_attacks.items()),
+                self.piece_score, self.threat_score, self.mobility_score, self.max_threat_mask, self.min_threat_mask,
+                self.black_capture_mask, self.white_capture_mask)
+
+    def load_threats(self, entry: tuple):
+        (_, _, max_attacks, min_attacks, self.piece_score, self.threat_score, self.mobility_score,
+         self.max_threat_mask, self.min_threat_mask, self.black_capture_mask, self.white_capture_mask) = entry
+        self.attacks = (dict(max_attacks), dict(min_attacks))
+        self.max_attacks = self.attacks[False]
+        self.min_attacks = self.attacks[True]
+
+    '''
+    Plays move on this board in place, returns the updated num_moves_without_capture.
+    The threats of the new position come from the threat cache if it has the position,
+    otherwise only the moved and captured pieces, and pieces whose reach covers the start
+    or end square, get their threats recomputed. Undo with unmake_move
+    '''
+    def make_move(self, move: tuple, num_moves_without_capture: int, is_min_move: bool):
+        start = move[0]
+        end = move[1]
+        changed = (1 << start) | (1 << end)
+        bitboard = self.bitboard
+        moving_piece_type, captured_type = bitboard.move_piece(start, end, is_min_move)
+        replaced = []
+        self.history.append((start, end, is_min_move, moving_piece_type, captured_type, replaced, self.attacks,
+                             self.piece_score, self.threat_score, self.mobility_score, self.checkmate,
+                             self.max_threat_mask, self.min_threat_mask,
+                             self.black_capture_mask, self.white_capture_mask, self.is_terminal_game))
+        self.checkmate = None
+
+        entry = None if self.threat_cache is None else self.threat_cache.get(bitboard)
+        if entry is not None:
+            self.load_threats(entry)
+            if captured_type is None:
+                return num_moves_without_capture + 1
+            if captured_type == KING:
+                self.is_terminal_game = True # Since a King is captured
+            return 0
+
+        sign = -1 if is_min_move else 1
+        own_attacks = self.attacks[is_min_move]
+        enemy_attacks = self.attacks[not is_min_move]
+
+        record = own_attacks.pop(start)
+        replaced.append((own_attacks, start, record))
+        self.threat_score -= sign * record[ATTACK_VALUE]
+        self.mobility_score -= sign * record[ATTACK_MOBILITY]
+        replaced.append((own_attacks, end, None))
+        moved_record = (moving_piece_type, 0, 0, 0, 0)
+        own_attacks[end] = moved_record
+
+        if captured_type is not None:
+            record = enemy_attacks.pop(end)
+            replaced.append((enemy_attacks, end, record))
+            self.threat_score += sign * record[ATTACK_VALUE]
+            self.mobility_score += sign * record[ATTACK_MOBILITY]
+            self.piece_score += sign * PIECE_SCORES[captured_type]
+            if captured_type == KING:
+                self.is_terminal_game = True # Since a King is captured
 
+        for (attacks, is_black) in ((own_attacks, is_min_move), (enemy_attacks, not is_min_move)):
+            for (sq, record) in attacks.items():
+                if record[ATTACK_REACH] & changed or record is moved_record:
+                    if record is not moved_record:
+                        replaced.append((attacks, sq, record))
+                    new_record = GameBoard.attack_record(record[ATTACK_TYPE], sq, bitboard, is_black)
+                    attacks[sq] = new_record
+                    if is_black:
+                        self.threat_score -= new_record[ATTACK_VALUE] - record[ATTACK_VALUE]
+                        self.mobility_score -= new_record[ATTACK_MOBILITY] - record[ATTACK_MOBILITY]
+                    else:
+                        self.threat_score += new_record[ATTACK_VALUE] - record[ATTACK_VALUE]
+                        self.mobility_score += new_record[ATTACK_MOBILITY] - record[ATTACK_MOBILITY]
+
+        self.update_threat_masks()
+        if self.threat_cache is not None:
+            self.threat_cache.put(bitboard.hash, self.threats_entry())
+
+        if captured_type is not None:
+            return 0
+        else:
+            return num_moves_without_capture + 1
+
+    '''
+    Takes back the last move played with make_move
+    '''
+    def unmake_move(self):
+        (start, end, is_min_move, moving_piece_type, captured_type, replaced, attacks,
+         self.piece_score, self.threat_score, self.mobility_score, self.checkmate,
+         self.max_threat_mask, self.min_threat_mask,
+         self.black_capture_mask, self.white_capture_mask, self.is_terminal_game) = self.history.pop()
+        self.bitboard.unmove_piece(start, end, is_min_move, moving_piece_type, captured_type)
+        if attacks is not self.attacks:
+            # The position was loaded from the threat cache
+            self.attacks = attacks
+            self.max_attacks = attacks[False]
+            self.min_attacks = attacks[True]
+        for (attacks, sq, record) in reversed(replaced):
+            if record is None:
+                del attacks[sq]
             else:
-                if piece_type == PAWN_STRING:
-                    self.black_pieces[piece_type].append(pos)
-                else:
-                    self.black_pieces[piece_type] = pos
-                self.piece_score -= Piece.score[piece_type]
-                threat_set = Piece.assign_threats(piece_type, pos, board, True)
-                self.threat_score -= Piece.calculate_threat(threat_set, board, self.white_capture_candidates, MIN)
-                self.update_pieces_with_threats(MIN, threat_set, pos)
-        
-        self.is_terminal_game = False
-        
-        if not KING_STRING in self.white_pieces or not KING_STRING in self.black_pieces:
-            self.is_terminal_game = True # Since a King is captured
-    
+                attacks[sq] = record
+
+    # Dictionary views of the bitboard, kept for code written against the dict API
+
+    @property
+    def board(self):
+        return self.bitboard.to_dict()
+
+    @property
+    def white_pieces(self):
+        return self.pieces_dict(self.bitboard.pieces[False])
+
+    @property
+    def black_pieces(self):
+        return self.pieces_dict(self.bitboard.pieces[True])
+
+    @property
+    def max_threats(self):
+        return self.threats_dict(self.max_attacks)
+
+    @property
+    def min_threats(self):
+        return self.threats_dict(self.min_attacks)
+
+    @property
+    def white_capture_candidates(self):
+        return set(self.positions(self.white_capture_mask))
+
+    @property
+    def black_capture_candidates(self):
+        return set(self.positions(self.black_capture_mask))
+
+    def positions(self, mask: int):
+        positions = self.bitboard.geometry.positions
+        while mask:
+            low_bit = mask & -mask
+            yield positions[low_bit.bit_length() - 1]
+            mask ^= low_bit
+
+    def pieces_dict(self, pieces: list):
+        pieces_by_type = {PAWN_STRING: []}
+        for (piece_type, mask) in enumerate(pieces):
+            if not mask:
+                continue
+            if piece_type == PAWN:
+                pieces_by_type[PAWN_STRING].extend(self.positions(mask))
+            else:
+                pieces_by_type[PIECE_STRINGS[piece_type]] = self.bitboard.geometry.positions[mask.bit_length() - 1]
+        return pieces_by_type
+
+    def threats_dict(self, attacks: dict):
+        threats = {}
+        for (start_sq, record) in attacks.items():
+            for pos in self.positions(record[ATTACK_THREATS]):
+                if pos not in threats:
+                    threats[pos] = set()
+                threats[pos].add(self.bitboard.geometry.positions[start_sq])
+        return threats
+
     '''
     Returns True if the State is a Win, Loss or Draw State - No Piece threatening each other
     '''
     def is_terminal(self, player):
-        if self.is_terminal_game:
+        return self.is_terminal_game or self.checkmate_status() != 0 or not self.has_moves(player)
+
+    '''
+    Returns 1 if the Black King is checkmated, -1 if the White King is, 0 otherwise.
+    Worked out once per position, make_move and unmake_move keep the result with the position
+    '''
+    def checkmate_status(self):
+        if self.checkmate is None:
+            white_pieces = self.bitboard.pieces[False]
+            black_pieces = self.bitboard.pieces[True]
+            geometry = self.bitboard.geometry
+            if black_pieces[KING] and Piece.is_checkmate(black_pieces[KING].bit_length() - 1, self.max_threat_mask, geometry):
+                self.checkmate = 1
+            elif white_pieces[KING] and Piece.is_checkmate(white_pieces[KING].bit_length() - 1, self.min_threat_mask, geometry):
+                self.checkmate = -1
+            else:
+                self.checkmate = 0
+        return self.checkmate
+
+    '''
+    Returns True iff player has a move, without generating any
+    '''
+    def has_moves(self, player: bool):
+        return (self.max_threat_mask if player is MAX else self.min_threat_mask) != 0
+
+    '''
+    Returns True iff move is a move of player on this board, e.g. a move from the transposition table
+    '''
+    def is_legal_move(self, move: tuple, player: bool):
+        record = (self.max_attacks if player is MAX else self.min_attacks).get(move[0])
+        return record is not None and (record[ATTACK_THREATS] >> move[1]) & 1 == 1
+
+    '''
+    Returns False if move, of the color is_black, can neither threaten the enemy King with the
+    piece moved nor uncover a line to it, judged from the reach masks so without making the move
+    '''
+    def may_threaten_king(self, move: tuple, is_black: bool):
+        bitboard = self.bitboard
+        king = bitboard.pieces[not is_black][KING]
+        if not king:
             return True
-        else:
-            self.moves = self.actions(player)
-            return (len(self.max_threats) == 0) if player is MAX else (len(self.min_threats) == 0) or len(self.moves) == 0
-    
-    def actions(self, player: bool):
-        moves = []
-        moves_added = set()
+        king_sq = king.bit_length() - 1
+        geometry = bitboard.geometry
+        piece_type = bitboard.squares[move[0]]
+        # A Pawn threatens diagonally, so only from a square next to the King
+        reach = geometry.king_masks[king_sq] if piece_type == PAWN else geometry.reach_masks[is_black][piece_type][king_sq]
+        return bool(reach & (1 << move[1]) or geometry.reach_masks[is_black][QUEEN][king_sq] & (1 << move[0]))
+
+    '''
+    Returns False if the capture move, of the color is_black, can neither take or checkmate the enemy King
+    nor leave the enemy without moves, so evaluation scores the position after it with the weighted terms
+    '''
+    def capture_may_end_game(self, move: tuple, is_black: bool):
+        enemy_attacks = self.attacks[not is_black]
+        king = self.bitboard.pieces[not is_black][KING]
+        if enemy_attacks[move[1]][ATTACK_TYPE] == KING or king & (self.min_threat_mask if is_black else self.max_threat_mask) \
+                or self.may_threaten_king(move, is_black):
+            return True
+        # The other enemy pieces only gain moves from the capture
+        return not any(record[ATTACK_THREATS] for (sq, record) in enemy_attacks.items() if sq != move[1])
 
-        if player is MAX:
-            # Moves that capture King
-            moves.extend(Piece.moves_attacking_king(self.black_pieces[KING_STRING], self.max_threats, moves_added))
+    '''
+    @param first_move Move to yield first if it is legal here, e.g. the transposition table move
+    @param killers Quiet moves to yield before the other quiet moves if they are legal here
+    @param history Scores to sort the other quiet moves by, highest first
 
-            # Moves that will capture pieces
-            moves.extend(Piece.moves_attacking_others(self.black_capture_candidates, self.black_pieces, self.max_threats, moves_added))
-            
-            # All other moves that are not in moves_added
-            moves.extend(Piece.all_moves(self.max_threats, moves_added))
+    Generates the legal moves of player as (start square, end square) tuples, most promising
+    first, in stages: moves attacking the King, then captures, then quiet moves. Each stage is
+    only built when the previous one is used up, so a cutoff skips the remaining stages.
+    '''
+    def actions(self, player: bool, first_move: tuple = None, killers: list = (), history: dict = None):
+        is_black = player is MIN
+        attacks = self.min_attacks if is_black else self.max_attacks
+        if first_move is not None:
+            if self.is_legal_move(first_move, player):
+                yield first_move
+            else:
+                first_move = None
 
-        else:
-            # Moves that capture King
-            moves.extend(Piece.moves_attacking_king(self.white_pieces[KING_STRING], self.min_threats, moves_added))
+        # Moves that capture King
+        enemy_pieces = self.bitboard.pieces[not is_black]
+        moves, targets_added = Piece.moves_attacking_king(enemy_pieces[KING], attacks, 0, self.bitboard.geometry)
+        for move in moves:
+            if move != first_move:
+                yield move
 
-            # Moves that will capture pieces
-            moves.extend(Piece.moves_attacking_others(self.white_capture_candidates, self.white_pieces, self.min_threats, moves_added))
+        # Moves that will capture pieces
+        capture_mask = self.white_capture_mask if is_black else self.black_capture_mask
+        if capture_mask & ~targets_added:
+            moves, targets_added = Piece.moves_attacking_others(capture_mask, enemy_pieces, attacks, targets_added)
+            for move in moves:
+                if move != first_move:
+                    yield move
 
-            # All other moves that are not in moves_added
-            moves.extend(Piece.all_moves(self.min_threats, moves_added))
+        # All other moves that are not in targets_added
+        moves = Piece.all_moves(attacks, targets_added)
+        if history and len(moves) > 1:
+            moves.sort(key=history.__getitem__, reverse=True)
+        for killer in killers:
+            if killer is not None and killer != first_move and killer in moves:
+                moves.remove(killer)
+                yield killer
+        for move in moves:
+            if move != first_move:
+                yield move
 
+    '''
+    Returns the moves of player that capture a piece: the King capture first, then in MVV-LVA order
+    '''
+    def captures(self, player: bool):
+        is_black = player is MIN
+        attacks = self.min_attacks if is_black else self.max_attacks
+        capture_mask = self.white_capture_mask if is_black else self.black_capture_mask
+        enemy_pieces = self.bitboard.pieces[not is_black]
+        moves = Piece.moves_onto(enemy_pieces[KING] & capture_mask, attacks)
+        moves.extend(Piece.moves_attacking_others(capture_mask, enemy_pieces, attacks, enemy_pieces[KING])[0])
         return moves
 
     def execute_move(self, move: tuple, num_moves_without_capture: int, is_min_move: bool):
         start = move[0]
         end = move[1]
-        moving_piece_type = self.board[start][0]
-        is_capture = end in self.board
-        next_board = dict(self.board)
-        
+        is_capture = self.bitboard.all_occupancy() & (1 << end)
+        next_bitboard = self.bitboard.copy()
+
         # Update Board
-        del next_board[start]
-        if is_min_move:
-            next_board[end] = (moving_piece_type, "Black")
-        else:
-            next_board[end] = (moving_piece_type, WHITE_STRING)
+        next_bitboard.move_piece(start, end, is_min_move)
+
+        next_gameboard = GameBoard(next_bitboard)
 
-        next_gameboard = GameBoard(next_board)
-        
         if is_capture:
             return (0, next_gameboard)
         else:
             return (num_moves_without_capture + 1, next_gameboard)
-    
+
     '''
-    Returns 400 for win state, -400 for loss state, 0 for draw state, calculates piece and threats score to decide other states' value
+    Returns weights.win for win state (Black King captured or checkmated), -weights.win for loss state,
+    weights.draw for draw state, and the weighted material, threat and mobility score for other states
     '''
     def evaluation(self, num_moves, player):
-        if self.is_terminal(player):
-            if KING_STRING in self.black_pieces and Piece.is_checkmate(self.black_pieces[KING_STRING], self.max_threats):
-                return 400 # Win State -  Arbitrarily Large Number
-            elif KING_STRING in self.white_pieces and Piece.is_checkmate(self.white_pieces[KING_STRING], self.min_threats):
-                return -400 # Loss State - Arbitrarily Small Number
-            else:    
-                final_score =  self.piece_score # Calculated Utility for this State
-                return final_score
-        elif num_moves >= 50 and KING_STRING in self.black_pieces and KING_STRING in self.white_pieces:
-            return 0 # Draw - Zero Value
+        weights = self.weights
+        if self.is_terminal_game:
+            return weights.win if self.bitboard.pieces[False][KING] else -weights.win
+        checkmate = self.checkmate_status()
+        if checkmate != 0:
+            return checkmate * weights.win
+        if num_moves >= FIFTY_MOVES or not self.has_moves(player):
+            return weights.draw # Draw - No captures in 50 moves or no moves to make
+        # Calculated Utility for this State
+        return weights.material * self.piece_score + weights.threat * self.threat_score + weights.mobility * self.mobility_score
+
+class TranspositionTable:
+    '''
+    @param size_mb Memory budget of the table in megabytes
+
+    Fixed-size table of searched positions, indexed by Zobrist key. Every bucket has a
+    depth-preferred slot, kept while it holds the deepest search of the current generation,
+    and an always-replace slot that takes every other store.
+    '''
+    # Rough size of one stored entry tuple with its ints, in bytes
+    ENTRY_BYTES = 144
+
+    def __init__(self, size_mb: float = TRANSPOSITION_TABLE_MB):
+        buckets = max(1, int(size_mb * 1024 * 1024 / (2 * TranspositionTable.ENTRY_BYTES)))
+        # Round down to a power of two so that a bucket is found by masking the key
+        self.mask = (1 << (buckets.bit_length() - 1)) - 1
+        self.slots = [None] * (2 * (self.mask + 1))
+        self.generation = 0
+
+    '''
+    Makes entries of earlier searches replaceable by the next search
+    '''
+    def new_search(self):
+        self.generation += 1
+
+    def clear(self):
+        self.slots = [None] * len(self.slots)
+
+    '''
+    Returns the entry stored for key, or None
+    '''
+    def probe(self, key: int):
+        index = (key & self.mask) << 1
+        entry = self.slots[index]
+        if entry is not None and entry[ENTRY_KEY] == key:
+            return entry
+        entry = self.slots[index + 1]
+        if entry is not None and entry[ENTRY_KEY] == key:
+            return entry
+        return None
+
+    def store(self, key: int, depth: int, flag: int, value, move: tuple):
+        index = (key & self.mask) << 1
+        entry = (key, depth, flag, value, move, self.generation)
+        deepest = self.slots[index]
+        if deepest is None or deepest[ENTRY_KEY] == key or depth >= deepest[ENTRY_DEPTH] or deepest[ENTRY_GENERATION] != self.generation:
+            self.slots[index] = entry
         else:
-            final_score = self.piece_score # Calculated Utility for this State
-            return final_score
-    
-    def update_pieces_with_threats(self, player: bool, threat_set: set, pos: tuple):
-        threat_dict = self.max_threats if player is MAX else self.min_threats
-        for threatened_pos in threat_set:
-            if threatened_pos not in threat_dict:
-                threat_dict[threatened_pos] = set()
-            threat_dict[threatened_pos].add(pos)
-
-def max_move(gameboard: GameBoard, num_moves_without_capture: int, depth, alpha, beta):
-    #  if we are at a leaf node, or if MAX/MIN cannot make any more moves
-    if depth == 0 or gameboard.is_terminal(MAX) or num_moves_without_capture == 50:
-        eval = gameboard.evaluation(MAX, num_moves_without_capture) # Evaluation of Leaf Nodes
-        return eval, None
-    
-    maxEval = NEG_INF
-    best_move = None
-    for move in gameboard.moves: # Move Ordering done here
-        num_moves_without_capture, next_gameboard = gameboard.execute_move(move, num_moves_without_capture ,False)
-        eval, returned_move = min_move(next_gameboard, num_moves_without_capture, depth - 1, alpha, beta)
-        if eval > maxEval:
-            maxEval = eval
-            best_move = move
-        alpha = max(maxEval, alpha)
+            self.slots[index + 1] = entry
+
+'''
+Returns (result, move) for the entry stored in table for key. result is the stored
+(value, move) if the entry is deep enough and its bound decides the (alpha, beta) window,
+otherwise None. move is the stored best move if it is legal for player, otherwise None.
+'''
+def probe_table(table: TranspositionTable, key: int, gameboard: GameBoard, player: bool, depth: int, alpha, beta):
+    entry = table.probe(key)
+    if entry is None:
+        return None, None
+    move = entry[ENTRY_MOVE]
+    if move is None or not gameboard.is_legal_move(move, player):
+        return None, None
+    if entry[ENTRY_DEPTH] >= depth:
+        value = entry[ENTRY_VALUE]
+        flag = entry[ENTRY_FLAG]
+        if flag == EXACT or (flag == LOWER_BOUND and value >= beta) or (flag == UPPER_BOUND and value <= alpha):
+            return (value, move), move
+    return None, move
+
+class Tablebase:
+    '''
+    @param path Path of a file written by tablebase.py
+
+    Reads an endgame tablebase through a memory map, so opening it costs nothing but reading the
+    directory of piece sets. For every position with at most max_pieces pieces and either side
+    to move, the file has one byte: 0 if neither side can force a result within FIFTY_MOVES
+    moves without a capture, WIN + d if the side to move can and LOSS + d if the other side can,
+    where d is the number of moves until the next capture or checkmate in the best play
+    '''
+    MAGIC = b"ABTB"
+    # Magic, version, rows, cols, max_pieces and number of piece sets
+    HEADER = struct.Struct("<4sBBBBI")
+    # Piece counts of White then Black by piece code, and the offset of the data of the piece set
+    DIRECTORY_ENTRY = struct.Struct("<%dsQ" % (2 * len(PIECE_TYPES)))
+    VERSION = 1
+    WIN = 0
+    LOSS = 128
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as tablebase_file:
+            self.data = mmap.mmap(tablebase_file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.rows, self.cols, self.max_pieces, count = Tablebase.HEADER.unpack_from(self.data, 0)
+        if magic != Tablebase.MAGIC or version != Tablebase.VERSION:
+            raise ValueError("%s is not a version %d tablebase" % (path, Tablebase.VERSION))
+        self.size = self.rows * self.cols
+        self.offsets = {}
+        for i in range(count):
+            key, offset = Tablebase.DIRECTORY_ENTRY.unpack_from(self.data, Tablebase.HEADER.size + i * Tablebase.DIRECTORY_ENTRY.size)
+            self.offsets[key] = offset
+
+    '''
+    Returns the Tablebase at path, or None if there is no file there or it is not a tablebase
+    '''
+    def open(path: str = TABLEBASE_PATH):
+        if not os.path.exists(path):
+            return None
+        try:
+            return Tablebase(path)
+        except (OSError, ValueError, struct.error):
+            return None
+
+    def close(self):
+        self.data.close()
+
+    def matches(self, geometry: Geometry):
+        return geometry.rows == self.rows and geometry.cols == self.cols
+
+    '''
+    Returns the piece set of bitboard, the piece counts of White then Black by piece code
+    '''
+    def piece_set(bitboard: BitBoard):
+        return bytes([mask.bit_count() for pieces in bitboard.pieces for mask in pieces])
+
+    '''
+    Returns the index of the position of bitboard among those of its piece set with one side to move:
+    the squares of White's pieces then Black's by piece code, lowest square first, as digits base size
+    '''
+    def position_index(bitboard: BitBoard):
+        size = bitboard.geometry.size
+        index = 0
+        factor = 1
+        for pieces in bitboard.pieces:
+            for mask in pieces:
+                while mask:
+                    low_bit = mask & -mask
+                    index += (low_bit.bit_length() - 1) * factor
+                    factor *= size
+                    mask ^= low_bit
+        return index
+
+    '''
+    Returns the byte stored for gameboard with player to move, or None if it is not in the tablebase
+    '''
+    def entry(self, gameboard: GameBoard, player: bool):
+        bitboard = gameboard.bitboard
+        pieces = (bitboard.occupancy[0] | bitboard.occupancy[1]).bit_count()
+        if pieces > self.max_pieces:
+            return None
+        offset = self.offsets.get(Tablebase.piece_set(bitboard))
+        if offset is None:
+            return None
+        if player is MIN:
+            offset += self.size ** pieces
+        return self.data[offset + Tablebase.position_index(bitboard)]
+
+    '''
+    Returns (outcome, moves) for gameboard with player to move and num_moves_without_capture
+    played: outcome is 1 if player wins, -1 if player loses and 0 for a draw, moves is the number
+    of moves until the game ends or the next capture. Returns None if the position is not in the
+    tablebase or the result depends on more moves than the fifty move rule leaves
+    '''
+    def result(self, gameboard: GameBoard, player: bool, num_moves_without_capture: int):
+        if gameboard.is_terminal_game:
+            return (1 if bool(gameboard.bitboard.pieces[False][KING]) == (player is MAX) else -1), 0
+        checkmate = gameboard.checkmate_status()
+        if checkmate != 0:
+            return (checkmate if player is MAX else -checkmate), 0
+        if num_moves_without_capture >= FIFTY_MOVES or not gameboard.has_moves(player):
+            return 0, 0
+        entry = self.entry(gameboard, player)
+        if entry is None:
+            return None
+        if entry == 0:
+            return 0, 0
+        outcome, moves = (1, entry - Tablebase.WIN) if entry < Tablebase.LOSS else (-1, entry - Tablebase.LOSS)
+        if num_moves_without_capture + moves > FIFTY_MOVES:
+            return None
+        return outcome, moves
+
+    '''
+    Returns the value of gameboard for MAX with player to move as the search scores it, or None
+    if the tablebase does not decide it
+    '''
+    def probe(self, gameboard: GameBoard, player: bool, num_moves_without_capture: int):
+        if (gameboard.bitboard.occupancy[0] | gameboard.bitboard.occupancy[1]).bit_count() > self.max_pieces:
+            return None
+        result = self.result(gameboard, player, num_moves_without_capture)
+        if result is None:
+            return None
+        outcome = result[0] if player is MAX else -result[0]
+        return gameboard.weights.draw if outcome == 0 else outcome * gameboard.weights.win
+
+    '''
+    Returns the best move of player by the tablebase, the quickest win, else a draw, else the
+    slowest loss, or None if the tablebase does not decide every move
+    '''
+    def best_move(self, gameboard: GameBoard, player: bool, num_moves_without_capture: int):
+        if self.result(gameboard, player, num_moves_without_capture) is None:
+            return None
+        best_move = None
+        best_rank = None
+        for move in list(gameboard.actions(player)):
+            next_num_moves = gameboard.make_move(move, num_moves_without_capture, player is MIN)
+            result = self.result(gameboard, not player, next_num_moves)
+            gameboard.unmake_move()
+            if result is None:
+                return None
+            # result is the one of the other player, prefer their loss, and the quickest of our wins or slowest of our losses
+            outcome, moves = result
+            rank = (-outcome, -moves if outcome == -1 else moves)
+            if best_rank is None or rank > best_rank:
+                best_move = move
+                best_rank = rank
+        return best_move
+
+class OpeningBook:
+    '''
+    @param path Path of a file written by book.py
+
+    Reads an opening book through a memory map. The file holds one entry per position with MAX
+    to move, sorted by Zobrist hash so that a position is found by binary search: the hash, the
+    start and end squares of the book move, and the depth and value of the search that chose it
+    '''
+    MAGIC = b"ABOB"
+    # Magic, version, rows, cols and number of entries
+    HEADER = struct.Struct("<4sBBBxI")
+    ENTRY = struct.Struct("<QBBBxf")
+    VERSION = 2
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as book_file:
+            self.data = mmap.mmap(book_file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.rows, self.cols, self.count = OpeningBook.HEADER.unpack_from(self.data, 0)
+        if magic != OpeningBook.MAGIC or version != OpeningBook.VERSION:
+            raise ValueError("%s is not a version %d opening book" % (path, OpeningBook.VERSION))
+
+    '''
+    Returns the OpeningBook at path, or None if there is no file there or it is not a book of this version
+    '''
+    def open(path: str = BOOK_PATH):
+        if not os.path.exists(path):
+            return None
+        try:
+            return OpeningBook(path)
+        except (OSError, ValueError, struct.error):
+            return None
+
+    def close(self):
+        self.data.close()
+
+    def matches(self, geometry: Geometry):
+        return geometry.rows == self.rows and geometry.cols == self.cols
+
+    '''
+    Returns the (key, start square, end square, depth, value) entry of the position with the given key, or None
+    '''
+    def entry(self, key: int):
+        low = 0
+        high = self.count
+        while low < high:
+            middle = (low + high) // 2
+            entry = OpeningBook.ENTRY.unpack_from(self.data, OpeningBook.HEADER.size + middle * OpeningBook.ENTRY.size)
+            if entry[0] < key:
+                low = middle + 1
+            elif entry[0] > key:
+                high = middle
+            else:
+                return entry
+        return None
+
+    '''
+    Returns the book move of MAX on gameboard, or None if the position is not in the book
+    '''
+    def lookup(self, gameboard: GameBoard):
+        entry = self.entry(gameboard.bitboard.hash)
+        if entry is None:
+            return None
+        move = (entry[1], entry[2])
+        # A different position with the same hash would rarely have the move
+        return move if gameboard.is_legal_move(move, MAX) else None
+
+class SearchTimeout(Exception):
+    '''
+    Raised from inside the search when its time or node limit is reached
+    '''
+    pass
+
+class SearchStats:
+    '''
+    Counters and phase timings of one search, collected when passed to ab() or set as
+    SearchState.stats. A search without one only pays a None check per node and move.
+    Phases are timed in seconds: "actions" (move generation), "make_move" (making and taking
+    back moves), "evaluation", "search" (all of ab) and any phase timed with phase()
+    '''
+    def __init__(self):
+        self.nodes = 0
+        self.quiescence_nodes = 0
+        # Nodes whose moves were searched, and the number of moves searched at them
+        self.expanded_nodes = 0
+        self.moves_searched = 0
+        self.cutoffs = 0
+        # Number of cutoffs by the index of the cutoff move in the move order, 0 is the first move
+        self.cutoff_indices = defaultdict(int)
+        self.table_probes = 0
+        self.table_hits = 0
+        # Null moves tried and the cutoffs they gave, moves searched with a reduced depth and how many of them were searched again,
+        # and quiet moves left out by futility pruning
+        self.null_moves = 0
+        self.null_move_cutoffs = 0
+        self.reductions = 0
+        self.re_searches = 0
+        self.futile_moves = 0
+        self.times = defaultdict(float)
+        # Depth, nodes, seconds, value and move of every completed iteration of ab
+        self.iterations = []
+
+    '''
+    Times the body of a with statement as phase name, e.g. with stats.phase("init"): GameBoard(board)
+    '''
+    @contextmanager
+    def phase(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield self
+        finally:
+            self.times[name] += time.perf_counter() - started
+
+    '''
+    Returns moves wrapped so that generating them is timed and counted
+    '''
+    def timed_moves(self, moves):
+        self.expanded_nodes += 1
+        return TimedMoves(self, moves)
+
+    def record_cutoff(self, index: int):
+        self.cutoffs += 1
+        self.cutoff_indices[index] += 1
+
+    '''
+    Returns the average number of moves searched per expanded node
+    '''
+    def branching_factor(self):
+        return self.moves_searched / self.expanded_nodes if self.expanded_nodes else 0
+
+    '''
+    Returns the fraction of cutoffs caused by the first move searched
+    '''
+    def first_move_cutoff_rate(self):
+        return self.cutoff_indices.get(0, 0) / self.cutoffs if self.cutoffs else 0
+
+    def to_dict(self):
+        return {
+            "nodes": self.nodes,
+            "quiescence_nodes": self.quiescence_nodes,
+            "expanded_nodes": self.expanded_nodes,
+            "moves_searched": self.moves_searched,
+            "branching_factor": self.branching_factor(),
+            "cutoffs": self.cutoffs,
+            "first_move_cutoff_rate": self.first_move_cutoff_rate(),
+            "cutoff_indices": {str(index): count for (index, count) in sorted(self.cutoff_indices.items())},
+            "table_probes": self.table_probes,
+            "table_hits": self.table_hits,
+            "null_moves": self.null_moves,
+            "null_move_cutoffs": self.null_move_cutoffs,
+            "reductions": self.reductions,
+            "re_searches": self.re_searches,
+            "futile_moves": self.futile_moves,
+            "times": dict(self.times),
+            "iterations": self.iterations
+        }
+
+    def to_json(self, **kwargs):
+        return json.dumps(self.to_dict(), **kwargs)
+
+    '''
+    Writes a summary of the search and one line per iteration to logger, the AB logger if None
+    '''
+    def log(self, logger: logging.Logger = None, level: int = logging.INFO):
+        logger = logger if logger is not None else logging.getLogger(__name__)
+        for iteration in self.iterations:
+            logger.log(level, "depth %d: %d nodes in %.3fs, value %s, move %s", iteration["depth"], iteration["nodes"],
+                       iteration["time"], iteration["value"], iteration["move"])
+        logger.log(level, "%d nodes (%d quiescence), branching factor %.2f, %d cutoffs (%.0f%% on the first move), %d/%d table hits",
+                   self.nodes, self.quiescence_nodes, self.branching_factor(), self.cutoffs, 100 * self.first_move_cutoff_rate(),
+                   self.table_hits, self.table_probes)
+        logger.log(level, "%d/%d null move cutoffs, %d/%d reduced moves searched again, %d futile moves", self.null_move_cutoffs,
+                   self.null_moves, self.re_searches, self.reductions, self.futile_moves)
+        logger.log(level, "time: %s", ", ".join("%s %.3fs" % (phase, seconds) for (phase, seconds) in self.times.items()))
+
+class TimedMoves:
+    '''
+    Iterator over the moves of a node that adds the time spent generating them to SearchStats
+    and counts how many were searched
+    '''
+    __slots__ = ('stats', 'moves', 'searched')
+
+    def __init__(self, stats: SearchStats, moves):
+        self.stats = stats
+        self.moves = moves
+        self.searched = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        started = time.perf_counter()
+        try:
+            move = next(self.moves)
+        finally:
+            self.stats.times["actions"] += time.perf_counter() - started
+        self.searched += 1
+        self.stats.moves_searched += 1
+        return move
+
+class SearchState:
+    '''
+    @param table Transposition table of the search, or None
+    @param deadline time.perf_counter() value at which the search stops, or None
+    @param node_limit Number of nodes after which the search stops, or None
+    @param stats SearchStats to record the search in, or None
+    @param tablebase Tablebase to look positions up in, or None
+    @param null_move Whether the search uses null-move pruning
+    @param late_move_reductions Whether the search uses late move reductions
+    @param futility Whether the search uses futility pruning
+    @param stop threading.Event that stops the search when set, or None
+
+    Data shared by every max_move/min_move call of one search
+    '''
+    def __init__(self, table: TranspositionTable = None, deadline: float = None, node_limit: int = None, stats: SearchStats = None,
+                 tablebase: Tablebase = None, null_move: bool = NULL_MOVE_PRUNING, late_move_reductions: bool = LATE_MOVE_REDUCTIONS,
+                 futility: bool = FUTILITY_PRUNING, stop = None):
+        self.table = table
+        self.deadline = deadline
+        self.node_limit = node_limit
+        self.stats = stats
+        self.tablebase = tablebase
+        self.null_move = null_move
+        self.late_move_reductions = late_move_reductions
+        self.futility = futility
+        self.stop = stop
+        # False while the node being entered is the reply to a null move, two null moves in a row prove nothing
+        self.allow_null = True
+        self.nodes = 0
+        self.reached_horizon = False
+        # Length of the board history at the root, the ply of a node is counted from there
+        self.root_ply = 0
+        # Two killer moves per ply, and history scores of the moves of each color
+        self.killers = [[None, None] for ply in range(MAX_PLY)]
+        self.history = (defaultdict(int), defaultdict(int))
+
+    '''
+    Counts a node, raises SearchTimeout once a limit is reached or the search is stopped
+    '''
+    def visit(self):
+        self.nodes += 1
+        if self.node_limit is not None and self.nodes > self.node_limit:
+            raise SearchTimeout()
+        if self.nodes % CLOCK_CHECK_INTERVAL == 0:
+            if self.deadline is not None and time.perf_counter() >= self.deadline:
+                raise SearchTimeout()
+            if self.stop is not None and self.stop.is_set():
+                raise SearchTimeout()
+
+    '''
+    Records that move caused a beta cutoff, quiet moves become killers of ply and gain history
+    '''
+    def record_cutoff(self, gameboard: GameBoard, move: tuple, depth: int, is_black: bool, ply: int):
+        if gameboard.bitboard.occupancy[not is_black] & (1 << move[1]):
+            return # Captures are already ordered first
+        if ply < MAX_PLY:
+            killers = self.killers[ply]
+            if killers[0] != move:
+                killers[1] = killers[0]
+                killers[0] = move
+        history = self.history[is_black]
+        history[move] += depth * depth
+
+'''
+Capture-only search at the horizon of player to move, values are from the point of view of
+player as in negamax. player may stand pat on the evaluation or try a capture, captures that
+cannot lift the score to alpha are pruned (delta pruning)
+'''
+def quiescence(gameboard: GameBoard, num_moves_without_capture: int, alpha, beta, player: bool, state: SearchState = None):
+    stats = None
+    if state is not None:
+        state.visit()
+        stats = state.stats
+        if stats is not None:
+            stats.quiescence_nodes += 1
+            started = time.perf_counter()
+    is_black = player is MIN
+    stand_pat = gameboard.evaluation(num_moves_without_capture, player)
+    if is_black:
+        stand_pat = -stand_pat
+    if stats is not None:
+        stats.times["evaluation"] += time.perf_counter() - started
+    if stand_pat >= beta or gameboard.is_terminal(player) or num_moves_without_capture >= FIFTY_MOVES:
+        return stand_pat
+
+    best_value = stand_pat
+    alpha = max(stand_pat, alpha)
+    victims = gameboard.attacks[not is_black]
+    weights = gameboard.weights
+    margin = weights.delta_margin()
+    # Near a win no capture is pruned
+    delta_pruning = alpha < weights.win - margin
+    if stats is not None:
+        started = time.perf_counter()
+    captures = gameboard.captures(player)
+    if stats is not None:
+        stats.times["actions"] += time.perf_counter() - started
+    for move in captures:
+        optimistic = stand_pat + weights.material * PIECE_SCORES[victims[move[1]][ATTACK_TYPE]] + margin
+        if delta_pruning and optimistic <= alpha and not gameboard.capture_may_end_game(move, is_black):
+            best_value = max(best_value, optimistic)
+            continue
+        if stats is not None:
+            started = time.perf_counter()
+        gameboard.make_move(move, num_moves_without_capture, is_black)
+        if stats is not None:
+            stats.times["make_move"] += time.perf_counter() - started
+        eval = -quiescence(gameboard, 0, -beta, -alpha, not player, state)
+        if stats is not None:
+            started = time.perf_counter()
+        gameboard.unmake_move()
+        if stats is not None:
+            stats.times["make_move"] += time.perf_counter() - started
+        if eval > best_value:
+            best_value = eval
+        alpha = max(best_value, alpha)
         if beta <= eval:
-            return (eval, move)
-    return (maxEval, best_move)
+            return eval
+    return best_value
 
-def min_move(gameboard: GameBoard, num_moves_without_capture, depth, alpha, beta):
+'''
+Alpha-beta search of player to move in negamax form: values are from the point of view of
+player, the evaluation for MAX and its negation for MIN, and each child is searched with the
+window negated. Principal variation search: the first move is searched with the full
+(alpha, beta) window, the others with a null window just above alpha that only tells whether
+they beat alpha, and again with the full window if they do. With state.null_move,
+state.late_move_reductions and state.futility, null-move pruning, late move reductions and
+futility pruning cut the null window searches short. Returns (value, best move)
+'''
+def negamax(gameboard: GameBoard, num_moves_without_capture: int, depth: int, alpha, beta, player: bool, state: SearchState = None):
+    is_black = player is MIN
+    table = None
+    stats = None
+    allow_null = False
+    if state is not None:
+        allow_null = state.allow_null
+        state.allow_null = True
+        state.visit()
+        table = state.table
+        stats = state.stats
+        if state.tablebase is not None and len(gameboard.history) > state.root_ply:
+            eval = state.tablebase.probe(gameboard, player, num_moves_without_capture)
+            if eval is not None:
+                return (-eval if is_black else eval), None
     #  if we are at a leaf node, or if MAX/MIN cannot make any more moves
-    if depth == 0 or gameboard.is_terminal(MIN) or num_moves_without_capture == 50:
-        eval = gameboard.evaluation(MIN, num_moves_without_capture) # Evaluation of Leaf Nodes
-        return eval, None
-    
-    minEval = POS_INF
+    if depth == 0 or gameboard.is_terminal(player) or num_moves_without_capture >= FIFTY_MOVES:
+        if depth == 0:
+            if state is not None:
+                state.reached_horizon = True
+            # Settle the captures left at the horizon before evaluating
+            return quiescence(gameboard, num_moves_without_capture, alpha, beta, player, state), None
+        if stats is not None:
+            started = time.perf_counter()
+        eval = gameboard.evaluation(num_moves_without_capture, player) # Evaluation of Leaf Nodes
+        if stats is not None:
+            stats.times["evaluation"] += time.perf_counter() - started
+        return (-eval if is_black else eval), None
+
+    first_move = None
+    killers = ()
+    history = None
+    ply = 0
+    if state is not None:
+        ply = len(gameboard.history) - state.root_ply
+        if ply < MAX_PLY:
+            killers = state.killers[ply]
+        history = state.history[is_black]
+    if table is not None:
+        key = gameboard.bitboard.hash ^ ZOBRIST_MIN_TO_MOVE if is_black else gameboard.bitboard.hash
+        stored, first_move = probe_table(table, key, gameboard, player, depth, alpha, beta)
+        if stats is not None:
+            stats.table_probes += 1
+            stats.table_hits += stored is not None
+        if stored is not None:
+            # The stored search may have reached the horizon, so a deeper iteration can differ
+            state.reached_horizon = True
+            return stored
+        original_alpha = alpha
+
+    bitboard = gameboard.bitboard
+    enemy_king = bitboard.pieces[not is_black][KING]
+    in_check = bitboard.pieces[is_black][KING] & (gameboard.max_threat_mask if is_black else gameboard.min_threat_mask)
+    # Only nodes searched with a null window are pruned or reduced, the principal variation is searched in full
+    is_null_window = beta - alpha <= 2 * NULL_WINDOW
+    static_eval = None
+    # Pass the move: a side that still beats beta after passing beats it with a real move. A side with
+    # only Pawns and its King is left out, it may be in zugzwang, where any move is worse than passing
+    if (allow_null and state.null_move and is_null_window and ply > 0 and depth >= NULL_MOVE_MIN_DEPTH and not in_check
+            and gameboard.has_moves(not player) and any(bitboard.pieces[is_black][piece_type] for piece_type in (KNIGHT, BISHOP, ROOK, QUEEN))):
+        static_eval = gameboard.evaluation(num_moves_without_capture, player)
+        static_eval = -static_eval if is_black else static_eval
+        if static_eval >= beta:
+            if stats is not None:
+                stats.null_moves += 1
+            state.allow_null = False
+            eval = -negamax(gameboard, num_moves_without_capture, depth - 1 - NULL_MOVE_REDUCTION, -beta, -beta + NULL_WINDOW, not player, state)[0]
+            if eval >= beta:
+                if stats is not None:
+                    stats.null_move_cutoffs += 1
+                return (beta, None)
+    reduce = state is not None and state.late_move_reductions and is_null_window and depth >= LMR_MIN_DEPTH and not in_check
+    futile = False
+    if (state is not None and state.futility and is_null_window and depth == 1 and not in_check
+            and num_moves_without_capture + 1 < FIFTY_MOVES):
+        # The quiet moves of a node at the frontier are settled together by its own evaluation: a quiet move
+        # changes only the threat and mobility scores, so they can lift the value no higher than this
+        if static_eval is None:
+            static_eval = gameboard.evaluation(num_moves_without_capture, player)
+            static_eval = -static_eval if is_black else static_eval
+        futile = static_eval + FUTILITY_MARGIN <= alpha
+
+    best_value = NEG_INF
     best_move = None
-    for move in gameboard.moves: # Move Ordering done here
-        num_moves_without_capture, next_gameboard = gameboard.execute_move(move, num_moves_without_capture, True)
-        eval, returned_move = max_move(next_gameboard, num_moves_without_capture, depth - 1, alpha, beta)
-        if eval < minEval:
-            minEval = eval
+    moves = gameboard.actions(player, first_move, killers, history) # Move Ordering done here
+    if stats is not None:
+        moves = stats.timed_moves(moves)
+    for (index, move) in enumerate(moves):
+        is_quiet = not bitboard.occupancy[not is_black] & (1 << move[1])
+        if futile and is_quiet and best_move is not None and not gameboard.may_threaten_king(move, is_black):
+            if stats is not None:
+                stats.futile_moves += 1
+            best_value = max(best_value, static_eval + FUTILITY_MARGIN)
+            continue
+        if stats is not None:
+            started = time.perf_counter()
+        next_num_moves = gameboard.make_move(move, num_moves_without_capture, is_black)
+        if stats is not None:
+            stats.times["make_move"] += time.perf_counter() - started
+        # Children at depth 1 are quiescence searches, too cheap for a null window to pay off
+        if best_move is None or depth == 1:
+            eval = -negamax(gameboard, next_num_moves, depth - 1, -beta, -alpha, not player, state)[0]
+        else:
+            reduction = 0
+            if (reduce and is_quiet and index >= LMR_MIN_MOVES and move not in killers
+                    and not enemy_king & (gameboard.min_threat_mask if is_black else gameboard.max_threat_mask)):
+                reduction = LMR_REDUCTION
+            eval = -negamax(gameboard, next_num_moves, depth - 1 - reduction, -alpha - NULL_WINDOW, -alpha, not player, state)[0]
+            if reduction:
+                if stats is not None:
+                    stats.reductions += 1
+                if eval > alpha:
+                    if stats is not None:
+                        stats.re_searches += 1
+                    eval = -negamax(gameboard, next_num_moves, depth - 1, -alpha - NULL_WINDOW, -alpha, not player, state)[0]
+            if alpha < eval < beta:
+                eval = -negamax(gameboard, next_num_moves, depth - 1, -beta, -alpha, not player, state)[0]
+        if stats is not None:
+            started = time.perf_counter()
+        gameboard.unmake_move()
+        if stats is not None:
+            stats.times["make_move"] += time.perf_counter() - started
+        if eval > best_value:
+            best_value = eval
             best_move = move
-        beta = min(minEval, beta)
-        if eval <= alpha:
+        alpha = max(best_value, alpha)
+        if beta <= eval:
+            if state is not None:
+                state.record_cutoff(gameboard, move, depth, is_black, ply)
+            if stats is not None:
+                stats.record_cutoff(moves.searched - 1)
+            if table is not None:
+                table.store(key, depth, LOWER_BOUND, eval, move)
             return (eval, move)
-    return (minEval, best_move)
-    
+    if table is not None:
+        table.store(key, depth, UPPER_BOUND if best_value <= original_alpha else EXACT, best_value, best_move)
+    return (best_value, best_move)
+
+'''
+Searches with MAX to move, returns (value for MAX, best move), see negamax
+'''
+def max_move(gameboard: GameBoard, num_moves_without_capture: int, depth, alpha, beta, state: SearchState = None):
+    return negamax(gameboard, num_moves_without_capture, depth, alpha, beta, MAX, state)
+
+'''
+Searches with MIN to move, returns (value for MAX, best move), see negamax
+'''
+def min_move(gameboard: GameBoard, num_moves_without_capture, depth, alpha, beta, state: SearchState = None):
+    eval, move = negamax(gameboard, num_moves_without_capture, depth, -beta, -alpha, MIN, state)
+    return -eval, move
+
+'''
+Searches depth from the root with a window of ASPIRATION_WINDOW on each side of guess, the value
+of the previous iteration. A value outside the window is only a bound, so the side it fell on is
+widened and the root searched again. Returns (value, best move)
+'''
+def aspiration_search(gameboard: GameBoard, depth: int, guess, state: SearchState):
+    window = ASPIRATION_WINDOW
+    alpha = guess - window
+    beta = guess + window
+    while True:
+        eval, move = negamax(gameboard, 0, depth, alpha, beta, MAX, state)
+        if eval <= alpha and alpha != NEG_INF:
+            window *= ASPIRATION_WIDENING
+            alpha = eval - window if window <= ASPIRATION_LIMIT else NEG_INF
+        elif eval >= beta and beta != POS_INF:
+            window *= ASPIRATION_WIDENING
+            beta = eval + window if window <= ASPIRATION_LIMIT else POS_INF
+        else:
+            return eval, move
+
 #Implement your minimax with alpha-beta pruning algorithm here.
-def ab(gameboard: GameBoard):
-    best_value, move = max_move(gameboard, 0, 3, NEG_INF, POS_INF)
+'''
+@param time_limit Seconds the search may take, or None for no time limit
+@param node_limit Number of nodes the search may visit, or None for no node limit
+@param table Transposition table to reuse, a new one of TRANSPOSITION_TABLE_MB is made if None
+@param max_depth Depth of the last iteration
+@param workers Number of processes to split the root moves across, see parallel_ab
+@param stats SearchStats to record the search in, only collected with one worker
+@param null_move Whether to use null-move pruning
+@param late_move_reductions Whether to use late move reductions
+@param futility Whether to use futility pruning
+
+Iterative deepening: searches depth 1, 2, ... until a limit is reached and returns the
+best move of the deepest completed iteration. The table carries the best moves of each
+iteration into the move ordering of the next one. With stats, returns (move, stats).
+'''
+def ab(gameboard: GameBoard, time_limit: float = SEARCH_TIME_LIMIT, node_limit: int = None, table: TranspositionTable = None, max_depth: int = MAX_SEARCH_DEPTH, workers: int = 1,
+       stats: SearchStats = None, null_move: bool = NULL_MOVE_PRUNING, late_move_reductions: bool = LATE_MOVE_REDUCTIONS,
+       futility: bool = FUTILITY_PRUNING):
+    if workers > 1:
+        if stats is not None:
+            raise ValueError("SearchStats are only collected by a search with one worker")
+        return parallel_ab(gameboard, time_limit, node_limit, max_depth, workers, null_move, late_move_reductions, futility)
+    started = time.perf_counter()
+    if table is None:
+        table = TranspositionTable()
+    table.new_search()
+    deadline = None if time_limit is None else started + time_limit
+    state = SearchState(table, deadline, node_limit, stats, None, null_move, late_move_reductions, futility)
+    move = iterative_deepening(gameboard, state, max_depth, started)
+    return finish_search(gameboard, move, state, started)
+
+'''
+@param started time.perf_counter() value at which the search started
+
+Runs the iterations of ab with state on gameboard, returns the best move of the deepest
+completed iteration, or None if not even the first one completed
+'''
+def iterative_deepening(gameboard: GameBoard, state: SearchState, max_depth: int, started: float):
+    stats = state.stats
+    positions = gameboard.bitboard.geometry.positions
+    history_length = len(gameboard.history)
+    state.root_ply = history_length
+
+    if state.tablebase is not None:
+        move = state.tablebase.best_move(gameboard, MAX, 0)
+        if move is not None:
+            return move # The tablebase knows the result of every move
+
+    move = None
+    best_value = None
+    for depth in range(1, max_depth + 1):
+        state.reached_horizon = False
+        try:
+            if best_value is None:
+                best_value, best_move = negamax(gameboard, 0, depth, NEG_INF, POS_INF, MAX, state)
+            else:
+                best_value, best_move = aspiration_search(gameboard, depth, best_value, state)
+        except SearchTimeout:
+            # Take back the moves of the interrupted iteration
+            while len(gameboard.history) > history_length:
+                gameboard.unmake_move()
+            break
+        move = best_move
+        if stats is not None:
+            stats.iterations.append({"depth": depth, "nodes": state.nodes, "time": time.perf_counter() - started, "value": best_value,
+                                     "move": None if move is None else (positions[move[0]], positions[move[1]])})
+        if not state.reached_horizon:
+            break # The whole game tree was searched, deeper iterations find the same move
     return move
 
-starting_pieces = {
-        ("e", 4) : (KING_STRING, "Black"),
-        ("d", 4): (QUEEN_STRING, "Black"),
-        ("c", 4): (BISHOP_STRING, "Black"),
-        ("b", 4): (KNIGHT_STRING, "Black"),
-        ("a", 4): (ROOK_STRING, "Black"),
-        ("a", 3): (PAWN_STRING, "Black"),
-        ("b", 3): (PAWN_STRING, "Black"),
-        ("c", 3): (PAWN_STRING, "Black"),
-        ("d", 3): (PAWN_STRING, "Black"),
-        ("e", 3): (PAWN_STRING, "Black"),
-        ("e", 0) : (KING_STRING, WHITE_STRING),
-        ("d", 0): (QUEEN_STRING, WHITE_STRING),
-        ("c", 0): (BISHOP_STRING, WHITE_STRING),
-        ("b", 0): (KNIGHT_STRING, WHITE_STRING),
-        ("a", 0): (ROOK_STRING, WHITE_STRING),
-        ("a", 1): (PAWN_STRING, WHITE_STRING),
-        ("b", 1): (PAWN_STRING, WHITE_STRING),
-        ("c", 1): (PAWN_STRING, WHITE_STRING),
-        ("d", 1): (PAWN_STRING, WHITE_STRING),
-        ("e", 1): (PAWN_STRING, WHITE_STRING)
-    }
+'''
+Returns the move of a search as positions, falling back to the first legal move if the search
+found none. With state.stats, returns (move, stats) after adding the totals of the search
+'''
+def finish_search(gameboard: GameBoard, move: tuple, state: SearchState, started: float):
+    if move is None and not gameboard.is_terminal_game and gameboard.has_moves(MAX):
+        # Not even the first iteration finished
+        move = next(gameboard.actions(MAX))
+    positions = gameboard.bitboard.geometry.positions
+    result = None if move is None else (positions[move[0]], positions[move[1]])
+    stats = state.stats
+    if stats is not None:
+        stats.nodes = state.nodes
+        stats.times["search"] += time.perf_counter() - started
+        return result, stats
+    return result
+
+# Best root value found so far at each depth, shared by the processes of parallel_ab
+shared_root_bounds = None
+
+def init_root_worker(root_bounds):
+    global shared_root_bounds
+    shared_root_bounds = root_bounds
+
+'''
+@param moves The root moves this process searches
+@param wall_deadline time.time() value at which the search stops, or None
+@param node_limit Number of nodes this process may visit, or None
+
+Iterative deepening over a subset of the root moves, run in a parallel_ab process.
+Every root move is searched with alpha raised to the best value any process has found
+at that depth. Returns, for every completed depth, the (value, move) of the best move of
+the subset, or (NEG_INF, None) if none of them beat the other processes' moves.
+'''
+def root_worker(board: dict, rows: int, cols: int, moves: list, wall_deadline: float, node_limit: int, max_depth: int,
+                null_move: bool = NULL_MOVE_PRUNING, late_move_reductions: bool = LATE_MOVE_REDUCTIONS, futility: bool = FUTILITY_PRUNING):
+    gameboard = GameBoard(BitBoard(board, Geometry.of(rows, cols)))
+    deadline = None if wall_deadline is None else time.perf_counter() + wall_deadline - time.time()
+    state = SearchState(TranspositionTable(), deadline, node_limit, None, None, null_move, late_move_reductions, futility)
+    moves = list(moves)
+    results = []
+
+    for depth in range(1, max_depth + 1):
+        state.table.new_search()
+        state.reached_horizon = False
+        best_value = NEG_INF
+        best_move = None
+        try:
+            for move in moves:
+                alpha = max(best_value, shared_root_bounds[depth])
+                next_num_moves = gameboard.make_move(move, 0, False)
+                eval, returned_move = min_move(gameboard, next_num_moves, depth - 1, alpha, POS_INF, state)
+                gameboard.unmake_move()
+                if eval > alpha:
+                    best_value = eval
+                    best_move = move
+                    with shared_root_bounds.get_lock():
+                        if eval > shared_root_bounds[depth]:
+                            shared_root_bounds[depth] = eval
+        except SearchTimeout:
+            break
+        results.append((best_value, best_move))
+        if best_move is not None:
+            # Search the best move first in the next iteration
+            moves.remove(best_move)
+            moves.insert(0, best_move)
+        if not state.reached_horizon:
+            break
+    return results
+
+'''
+Parallel version of ab: the root moves are dealt out across workers processes, which
+each deepen over their share and publish their best root value at every depth so that
+the other processes search with a narrower window. The move returned is the best one of
+the deepest iteration that every process completed.
+'''
+def parallel_ab(gameboard: GameBoard, time_limit: float, node_limit: int, max_depth: int, workers: int,
+                null_move: bool = NULL_MOVE_PRUNING, late_move_reductions: bool = LATE_MOVE_REDUCTIONS, futility: bool = FUTILITY_PRUNING):
+    if gameboard.is_terminal_game or not gameboard.has_moves(MAX):
+        return None
+    moves = list(gameboard.actions(MAX))
+    workers = min(workers, len(moves))
+    wall_deadline = None if time_limit is None else time.time() + time_limit
+    worker_node_limit = None if node_limit is None else max(1, node_limit // workers)
+    geometry = gameboard.bitboard.geometry
+    board = gameboard.bitboard.to_dict()
+
+    root_bounds = multiprocessing.Array('d', [NEG_INF] * (max_depth + 1))
+    with ProcessPoolExecutor(workers, initializer=init_root_worker, initargs=(root_bounds,)) as executor:
+        futures = [executor.submit(root_worker, board, geometry.rows, geometry.cols, moves[i::workers], wall_deadline, worker_node_limit, max_depth,
+                                   null_move, late_move_reductions, futility)
+                   for i in range(workers)]
+        results = [future.result() for future in futures]
+
+    move = moves[0] # Not even the first iteration finished
+    completed_depth = min(len(worker_results) for worker_results in results)
+    if completed_depth > 0:
+        best_value = NEG_INF
+        for worker_results in results:
+            value, worker_move = worker_results[completed_depth - 1]
+            if worker_move is not None and value > best_value:
+                best_value = value
+                move = worker_move
+    return (geometry.positions[move[0]], geometry.positions[move[1]])
+
+'''
+Returns the principal variation stored in table for gameboard with player to move: the
+stored best move, then the stored best reply to it, and so on, at most length moves
+'''
+def principal_variation(gameboard: GameBoard, table: TranspositionTable, player: bool = MAX, length: int = MAX_PLY):
+    moves = []
+    seen = set()
+    while len(moves) < length:
+        key = gameboard.bitboard.hash if player is MAX else gameboard.bitboard.hash ^ ZOBRIST_MIN_TO_MOVE
+        entry = table.probe(key)
+        if entry is None or key in seen or gameboard.is_terminal_game:
+            break
+        move = entry[ENTRY_MOVE]
+        if move is None or not gameboard.is_legal_move(move, player):
+            break
+        seen.add(key)
+        gameboard.make_move(move, 0, player is MIN)
+        moves.append(move)
+        player = not player
+    for move in moves:
+        gameboard.unmake_move()
+    return moves
+
+class SearchLimits:
+    '''
+    @param time_limit Seconds the search may take, or None for no time limit
+    @param node_limit Number of nodes the search may visit, or None for no node limit
+    @param max_depth Depth of the last iteration
+    '''
+    def __init__(self, time_limit: float = SEARCH_TIME_LIMIT, node_limit: int = None, max_depth: int = MAX_SEARCH_DEPTH):
+        self.time_limit = time_limit
+        self.node_limit = node_limit
+        self.max_depth = max_depth
+
+class Engine:
+    '''
+    @param geometry Geometry of the positions searched, the one of config.txt if None
+    @param weights EvaluationWeights of the search, DEFAULT_WEIGHTS if None
+    @param limits SearchLimits of a search that is not given its own
+    @param table_mb Memory budget of the transposition table in megabytes
+    @param workers Number of processes to search with, see parallel_ab
+    @param tablebase Tablebase the search looks positions up in, or None
+    @param book OpeningBook whose move is played without a search when it has the position, or None
+    @param null_move Whether to search with null-move pruning
+    @param late_move_reductions Whether to search with late move reductions
+    @param futility Whether to search with futility pruning
+    @param threat_cache_entries Capacity of the ThreatCache of the positions searched, 0 for none
+
+    Searches positions of one game with state kept between searches: the transposition table,
+    the threat cache, the history scores and killer moves, and the principal variation of the last search. When
+    the position is the one the principal variation expected after our move and the reply,
+    the search continues from the rest of it. Searches with workers > 1 keep no state.
+    '''
+    def __init__(self, geometry: Geometry = None, weights: EvaluationWeights = None, limits: SearchLimits = None,
+                 table_mb: float = TRANSPOSITION_TABLE_MB, workers: int = 1, tablebase: Tablebase = None,
+                 book: OpeningBook = None, null_move: bool = NULL_MOVE_PRUNING, late_move_reductions: bool = LATE_MOVE_REDUCTIONS,
+                 futility: bool = FUTILITY_PRUNING, threat_cache_entries: int = THREAT_CACHE_ENTRIES):
+        self.geometry = geometry
+        self.weights = weights
+        self.limits = limits if limits is not None else SearchLimits()
+        self.table = TranspositionTable(table_mb)
+        self.threat_cache = ThreatCache(threat_cache_entries) if threat_cache_entries > 0 else None
+        self.workers = workers
+        self.tablebase = tablebase
+        self.book = book
+        self.null_move = null_move
+        self.late_move_reductions = late_move_reductions
+        self.futility = futility
+        self.history = (defaultdict(int), defaultdict(int))
+        self.killers = [[None, None] for ply in range(MAX_PLY)]
+        # Moves of the last search, as (start square, end square), and the hash of the position expected next
+        self.principal_variation = []
+        self.expected_hash = None
+
+    '''
+    Forgets everything learned, e.g. before a new game
+    '''
+    def clear(self):
+        self.table.clear()
+        if self.threat_cache is not None:
+            self.threat_cache.clear()
+        self.history = (defaultdict(int), defaultdict(int))
+        self.killers = [[None, None] for ply in range(MAX_PLY)]
+        self.principal_variation = []
+        self.expected_hash = None
+
+    '''
+    @param position Dictionary of the gameboard, or a GameBoard, with MAX (White) to move. A dictionary is
+                    searched with the threat cache of the engine, a GameBoard with its own
+    @param limits SearchLimits of this search, self.limits if None
+    @param stats SearchStats to record the search in
+    @param stop threading.Event that stops the search when set, the best move found so far is returned
+
+    Returns the best move found as positions, like ab. With stats, returns (move, stats)
+    '''
+    def search(self, position, limits: SearchLimits = None, stats: SearchStats = None, stop = None):
+        limits = limits if limits is not None else self.limits
+        started = time.perf_counter()
+        gameboard = position if isinstance(position, GameBoard) else GameBoard(BitBoard(position, self.geometry), self.weights, self.threat_cache)
+        if self.book is not None and self.book.matches(gameboard.bitboard.geometry):
+            move = self.book.lookup(gameboard)
+            if move is not None:
+                self.principal_variation = [move]
+                self.expected_hash = None
+                return finish_search(gameboard, move, SearchState(stats=stats), started)
+        if self.workers > 1:
+            return ab(gameboard, limits.time_limit, limits.node_limit, None, limits.max_depth, self.workers, stats,
+                      self.null_move, self.late_move_reductions, self.futility)
+
+        self.table.new_search()
+        deadline = None if limits.time_limit is None else started + limits.time_limit
+        tablebase = self.tablebase if self.tablebase is not None and self.tablebase.matches(gameboard.bitboard.geometry) else None
+        state = SearchState(self.table, deadline, limits.node_limit, stats, tablebase, self.null_move, self.late_move_reductions,
+                            self.futility, stop)
+        predicted = self.principal_variation[2:] if gameboard.bitboard.hash == self.expected_hash else []
+        # Old history scores fade so that they do not outweigh what this search learns
+        for history in self.history:
+            for move in history:
+                history[move] //= 2
+        state.history = self.history
+        if predicted:
+            # Our move and the reply were played, the killers of ply 2 are now those of ply 0
+            state.killers = self.killers[2:] + [[None, None], [None, None]]
+
+        move = iterative_deepening(gameboard, state, limits.max_depth, started)
+        if move is None and predicted and gameboard.is_legal_move(predicted[0], MAX):
+            move = predicted[0]
+        self.killers = state.killers
+        self.principal_variation = principal_variation(gameboard, self.table) if move is not None else []
+        if not self.principal_variation or self.principal_variation[0] != move:
+            self.principal_variation = [] if move is None else [move]
+        self.expected_hash = None
+        if len(self.principal_variation) >= 2:
+            gameboard.make_move(self.principal_variation[0], 0, False)
+            gameboard.make_move(self.principal_variation[1], 0, True)
+            self.expected_hash = gameboard.bitboard.hash
+            gameboard.unmake_move()
+            gameboard.unmake_move()
+        return finish_search(gameboard, move, state, started)
+
+# Starting position declared in config.txt, the board of Geometry.default()
+Geometry.default()
+starting_pieces = Geometry.default_board
+
+# Engine studentAgent searches with, it keeps what it learns between the moves of a game
+engine = Engine(workers=SEARCH_WORKERS, tablebase=Tablebase.open(), book=OpeningBook.open())
 
 ### DO NOT EDIT/REMOVE THE FUNCTION HEADER BELOW###
 # Chess Pieces: King, Queen, Knight, Bishop, Rook (First letter capitalized)
@@ -615,7 +2093,5 @@ starting_pieces = {
 def studentAgent(gameboard):
     # MAX is always White piece
 
-    game_board = GameBoard(gameboard)
-    
-    move = ab(game_board)
+    move = engine.search(gameboard)
     return move
@@ -0,0 +1,195 @@
+import argparse
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from AB import BitBoard, GameBoard, Geometry, SearchStats, TranspositionTable, ab, load_config, PIECE_CODES, WHITE_STRING, \
+    SEARCH_TIME_LIMIT, MAX_SEARCH_DEPTH
+
+# Positions sent to a worker process at a time
+CHUNK_SIZE = 8
+# Chunks each worker may have queued before the input is read further
+CHUNKS_IN_FLIGHT = 2
+# Memory budget of the transposition table of each worker, in megabytes
+BATCH_TABLE_MB = 4
+
+# Transposition table of this worker process, cleared for every position so that results do not depend on the chunking
+worker_table = None
+
+'''
+Returns the position tuple of a square such as "e4"
+'''
+def parse_square(square: str):
+    return (square[0], int(square[1:]))
+
+def format_square(pos: tuple):
+    return "%s%d" % pos
+
+'''
+@param path Path of a JSONL file, "-" for stdin
+
+Yields a task per non-empty line. A line holds an object with the position under "board",
+square to [piece type, color] (e.g. {"board": {"e4": ["King", "Black"], "e0": ["King", "White"]}}),
+and optionally an "id", the "rows" and "cols" of the board, and a "time_limit", "node_limit"
+or "max_depth" of its own. Lines that are not valid JSON become tasks that report the error
+'''
+def read_jsonl(path: str):
+    lines = sys.stdin if path == "-" else open(path)
+    try:
+        for (number, line) in enumerate(lines, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                task = json.loads(line)
+            except ValueError as error:
+                task = {"error": "line %d is not JSON: %s" % (number, error)}
+            if not isinstance(task, dict):
+                task = {"error": "line %d is not a JSON object" % number}
+            task.setdefault("id", number)
+            yield task
+    finally:
+        if lines is not sys.stdin:
+            lines.close()
+
+'''
+Yields a task per file in the format of config.txt, its id is the path of the file
+'''
+def read_configs(paths: list):
+    for path in paths:
+        try:
+            geometry, board = load_config(path)
+        except (OSError, ValueError) as error:
+            yield {"id": path, "error": str(error)}
+            continue
+        yield {"id": path, "rows": geometry.rows, "cols": geometry.cols,
+               "board": {format_square(pos): list(piece_info) for (pos, piece_info) in board.items()}}
+
+'''
+Returns the (geometry, board) of the "board", "rows" and "cols" of a task, raises ValueError if they are not a position
+'''
+def read_position(task: dict):
+    try:
+        geometry = Geometry.of(task["rows"], task["cols"]) if "rows" in task else Geometry.default()
+        board = {}
+        for (square, piece_info) in task["board"].items():
+            pos = parse_square(square)
+            if pos not in geometry.squares or len(piece_info) != 2 or piece_info[0] not in PIECE_CODES or piece_info[1] not in (WHITE_STRING, "Black"):
+                raise ValueError("invalid piece %s on %s" % (piece_info, square))
+            board[pos] = (piece_info[0], piece_info[1])
+    except (KeyError, TypeError, ValueError, IndexError, AttributeError) as error:
+        raise ValueError("invalid position: %r" % (error,))
+    return geometry, board
+
+'''
+@param integer Whether the limit must be a whole number
+Returns the number under key in request, default if it has none, raises ValueError if it is not a positive number or null
+'''
+def read_limit(request: dict, key: str, default, integer: bool = False):
+    value = request.get(key, default)
+    if value is not None and (isinstance(value, bool) or not isinstance(value, int if integer else (int, float)) or value <= 0):
+        raise ValueError("%s must be a positive %s or null, not %r" % (key, "integer" if integer else "number", value))
+    return value
+
+'''
+@param task Task of read_jsonl or read_configs
+@param limits Default time_limit, node_limit and max_depth of the task
+
+Searches the position of task with ab(), returns its result as a JSON-ready dict
+'''
+def analyse(task: dict, limits: dict):
+    global worker_table
+    result = {"id": task.get("id")}
+    if "error" in task:
+        result["error"] = task["error"]
+        return result
+    try:
+        geometry, board = read_position(task)
+        time_limit = read_limit(task, "time_limit", limits["time_limit"])
+        node_limit = read_limit(task, "node_limit", limits["node_limit"], True)
+        max_depth = read_limit(task, "max_depth", limits["max_depth"], True)
+    except ValueError as error:
+        result["error"] = str(error)
+        return result
+
+    if worker_table is None:
+        worker_table = TranspositionTable(BATCH_TABLE_MB)
+    else:
+        worker_table.clear()
+    started = time.perf_counter()
+    move, stats = ab(GameBoard(BitBoard(board, geometry)), time_limit, node_limit, worker_table, max_depth, stats=SearchStats())
+    result["move"] = None if move is None else [format_square(move[0]), format_square(move[1])]
+    if stats.iterations:
+        result["depth"] = stats.iterations[-1]["depth"]
+        result["value"] = stats.iterations[-1]["value"]
+    result["nodes"] = stats.nodes
+    result["time"] = time.perf_counter() - started
+    return result
+
+def analyse_chunk(tasks: list, limits: dict):
+    return [analyse(task, limits) for task in tasks]
+
+'''
+@param tasks Iterable of tasks, read lazily
+@param workers Number of processes, the tasks are analysed in this process if 1
+@param chunk_size Number of tasks sent to a process at a time
+@param limits Default time_limit, node_limit and max_depth of a task
+
+Yields the result of every task in the order of tasks. At most CHUNKS_IN_FLIGHT chunks per
+worker are read ahead, so the input is streamed rather than loaded whole.
+'''
+def analyse_batch(tasks, workers: int = os.cpu_count() or 1, chunk_size: int = CHUNK_SIZE, limits: dict = None):
+    limits = dict({"time_limit": SEARCH_TIME_LIMIT, "node_limit": None, "max_depth": MAX_SEARCH_DEPTH}, **(limits or {}))
+    if workers <= 1:
+        for task in tasks:
+            yield analyse(task, limits)
+        return
+
+    with ProcessPoolExecutor(workers) as executor:
+        pending = deque()
+        chunk = []
+        for task in tasks:
+            chunk.append(task)
+            if len(chunk) == chunk_size:
+                pending.append(executor.submit(analyse_chunk, chunk, limits))
+                chunk = []
+                while len(pending) >= workers * CHUNKS_IN_FLIGHT:
+                    yield from pending.popleft().result()
+        if chunk:
+            pending.append(executor.submit(analyse_chunk, chunk, limits))
+        while pending:
+            yield from pending.popleft().result()
+
+def main(argv: list = None):
+    parser = argparse.ArgumentParser(description="Searches a batch of positions with AB.py and writes one JSON result per line")
+    parser.add_argument("inputs", nargs="+", help="A JSONL file of positions (- for stdin), or files in the format of config.txt with --config")
+    parser.add_argument("--config", action="store_true", help="Read the inputs as config.txt files, one position each")
+    parser.add_argument("--output", help="File to write the results to, stdout by default")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--time-limit", type=float, default=SEARCH_TIME_LIMIT, help="Seconds per position, 0 for none")
+    parser.add_argument("--node-limit", type=int, help="Nodes per position")
+    parser.add_argument("--max-depth", type=int, default=MAX_SEARCH_DEPTH)
+    args = parser.parse_args(argv)
+
+    if args.config:
+        tasks = read_configs(args.inputs)
+    else:
+        tasks = (task for path in args.inputs for task in read_jsonl(path))
+    limits = {"time_limit": args.time_limit or None, "node_limit": args.node_limit, "max_depth": args.max_depth}
+
+    output = sys.stdout if args.output is None else open(args.output, "w")
+    try:
+        for result in analyse_batch(tasks, args.workers, args.chunk_size, limits):
+            output.write(json.dumps(result) + "\n")
+            output.flush()
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
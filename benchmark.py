@@ -0,0 +1,257 @@
+import argparse
+import json
+import platform
+import sys
+import time
+
+from AB import EvaluationWeights, GameBoard, SearchStats, ThreatCache, ab, quiescence, starting_pieces, MAX, MIN, NEG_INF, POS_INF, \
+    NULL_MOVE_PRUNING, LATE_MOVE_REDUCTIONS, FUTILITY_PRUNING, THREAT_CACHE_ENTRIES, KING_STRING, QUEEN_STRING, BISHOP_STRING, ROOK_STRING, KNIGHT_STRING, PAWN_STRING, WHITE_STRING
+
+BLACK_STRING = "Black"
+
+PERFT_DEPTH = 4
+SEARCH_DEPTH = 5
+# Fraction of nodes/sec a position may lose against the previous run before compare() reports it
+NPS_TOLERANCE = 0.15
+# Weights the quiescence windows are checked with besides the default ones, and how far a window reaches
+WINDOW_CHECK_WEIGHTS = EvaluationWeights(material=4, threat=0.2, mobility=0.1)
+WINDOW_CHECK_WIDTH = 0.5
+
+# Positions of the 5x5 variant the benchmark is run on, in the dict format of studentAgent
+POSITIONS = {
+    "start": starting_pieces,
+    "open_files": {
+        ("e", 4): (KING_STRING, BLACK_STRING),
+        ("d", 4): (QUEEN_STRING, BLACK_STRING),
+        ("c", 4): (BISHOP_STRING, BLACK_STRING),
+        ("a", 4): (ROOK_STRING, BLACK_STRING),
+        ("b", 2): (KNIGHT_STRING, BLACK_STRING),
+        ("a", 3): (PAWN_STRING, BLACK_STRING),
+        ("d", 3): (PAWN_STRING, BLACK_STRING),
+        ("e", 3): (PAWN_STRING, BLACK_STRING),
+        ("e", 0): (KING_STRING, WHITE_STRING),
+        ("d", 0): (QUEEN_STRING, WHITE_STRING),
+        ("c", 0): (BISHOP_STRING, WHITE_STRING),
+        ("c", 2): (KNIGHT_STRING, WHITE_STRING),
+        ("a", 0): (ROOK_STRING, WHITE_STRING),
+        ("a", 1): (PAWN_STRING, WHITE_STRING),
+        ("b", 1): (PAWN_STRING, WHITE_STRING),
+        ("e", 1): (PAWN_STRING, WHITE_STRING)
+    },
+    "queens_off": {
+        ("e", 4): (KING_STRING, BLACK_STRING),
+        ("c", 4): (BISHOP_STRING, BLACK_STRING),
+        ("a", 4): (ROOK_STRING, BLACK_STRING),
+        ("b", 4): (KNIGHT_STRING, BLACK_STRING),
+        ("b", 3): (PAWN_STRING, BLACK_STRING),
+        ("c", 2): (PAWN_STRING, BLACK_STRING),
+        ("e", 3): (PAWN_STRING, BLACK_STRING),
+        ("e", 0): (KING_STRING, WHITE_STRING),
+        ("c", 0): (BISHOP_STRING, WHITE_STRING),
+        ("a", 0): (ROOK_STRING, WHITE_STRING),
+        ("d", 2): (KNIGHT_STRING, WHITE_STRING),
+        ("a", 1): (PAWN_STRING, WHITE_STRING),
+        ("b", 1): (PAWN_STRING, WHITE_STRING),
+        ("e", 1): (PAWN_STRING, WHITE_STRING)
+    },
+    "king_hunt": {
+        ("c", 4): (KING_STRING, BLACK_STRING),
+        ("b", 3): (PAWN_STRING, BLACK_STRING),
+        ("e", 0): (KING_STRING, WHITE_STRING),
+        ("d", 1): (QUEEN_STRING, WHITE_STRING),
+        ("a", 0): (ROOK_STRING, WHITE_STRING)
+    },
+    "knight_endgame": {
+        ("d", 4): (KING_STRING, BLACK_STRING),
+        ("b", 3): (KNIGHT_STRING, BLACK_STRING),
+        ("d", 2): (PAWN_STRING, BLACK_STRING),
+        ("b", 0): (KING_STRING, WHITE_STRING),
+        ("c", 1): (KNIGHT_STRING, WHITE_STRING),
+        ("a", 1): (PAWN_STRING, WHITE_STRING),
+        ("e", 1): (PAWN_STRING, WHITE_STRING)
+    }
+}
+
+'''
+@param gameboard GameBoard to count from
+@param depth Number of plies to count
+@param player Player to move
+@param incremental Count with make_move/unmake_move on gameboard instead of execute_move
+
+Returns the number of leaves of the game tree of the given depth, built from GameBoard.actions.
+A position where the game is over counts as a leaf at any depth
+'''
+def perft(gameboard: GameBoard, depth: int, player: bool, incremental: bool = False):
+    if depth == 0 or gameboard.is_terminal(player):
+        return 1
+    leaves = 0
+    for move in list(gameboard.actions(player)):
+        if incremental:
+            gameboard.make_move(move, 0, player is MIN)
+            leaves += perft(gameboard, depth - 1, not player, True)
+            gameboard.unmake_move()
+        else:
+            leaves += perft(gameboard.execute_move(move, 0, player is MIN)[1], depth - 1, not player)
+    return leaves
+
+'''
+Returns the perft counts of board for depths 1 to depth, and the seconds they took.
+The counts are made with execute_move and checked against make_move
+'''
+def perft_benchmark(board: dict, depth: int):
+    counts = {}
+    start = time.perf_counter()
+    for d in range(1, depth + 1):
+        counts[str(d)] = perft(GameBoard(dict(board)), d, MAX)
+    elapsed = time.perf_counter() - start
+    for d in range(1, depth + 1):
+        incremental = perft(GameBoard(dict(board)), d, MAX, True)
+        if incremental != counts[str(d)]:
+            raise AssertionError("perft %d is %d with execute_move but %d with make_move" % (d, counts[str(d)], incremental))
+    return {"counts": counts, "time": elapsed}
+
+'''
+Checks that quiescence search, in every position two plies after board, gives with a narrow window
+the value the full window gives, or a bound of it on the side of the window the value is on.
+Delta pruning must not skip a capture that reaches the window, whatever the weights.
+Returns the number of positions checked and the seconds the check took
+'''
+def window_check(board: dict):
+    positions = 0
+    start = time.perf_counter()
+    for weights in (None, WINDOW_CHECK_WEIGHTS):
+        gameboard = GameBoard(dict(board), weights)
+        for move in list(gameboard.actions(MAX)):
+            gameboard.make_move(move, 0, False)
+            replies = [] if gameboard.is_terminal(MIN) else list(gameboard.actions(MIN))
+            for reply in replies:
+                gameboard.make_move(reply, 0, True)
+                value = quiescence(gameboard, 0, NEG_INF, POS_INF, MAX)
+                for (alpha, beta) in ((value - WINDOW_CHECK_WIDTH, value + WINDOW_CHECK_WIDTH),
+                                      (value + WINDOW_CHECK_WIDTH, value + 2 * WINDOW_CHECK_WIDTH),
+                                      (value - 2 * WINDOW_CHECK_WIDTH, value - WINDOW_CHECK_WIDTH)):
+                    bound = quiescence(gameboard, 0, alpha, beta, MAX)
+                    if not (value <= bound <= alpha if bound <= alpha else beta <= bound <= value if bound >= beta else bound == value):
+                        raise AssertionError("quiescence of %s is %s with a full window but %s with (%s, %s)"
+                                             % (gameboard.bitboard.to_dict(), value, bound, alpha, beta))
+                positions += 1
+                gameboard.unmake_move()
+            gameboard.unmake_move()
+    return {"positions": positions, "time": time.perf_counter() - start}
+
+'''
+Searches board with ab() to depth without a time limit, with or without null-move pruning, late
+move reductions and futility pruning, and with a new ThreatCache of threat_cache_entries positions
+unless it is 0. Returns, per iteration, the nodes and
+seconds taken since the search started, the nodes/sec so far, and the value and move (e.g. "d1d2")
+'''
+def search_benchmark(board: dict, depth: int, null_move: bool = NULL_MOVE_PRUNING, late_move_reductions: bool = LATE_MOVE_REDUCTIONS,
+                     futility: bool = FUTILITY_PRUNING, threat_cache_entries: int = THREAT_CACHE_ENTRIES):
+    threat_cache = ThreatCache(threat_cache_entries) if threat_cache_entries > 0 else None
+    move, stats = ab(GameBoard(dict(board), None, threat_cache), None, None, None, depth, stats=SearchStats(), null_move=null_move,
+                     late_move_reductions=late_move_reductions, futility=futility)
+    iterations = []
+    for iteration in stats.iterations:
+        move = iteration["move"]
+        iterations.append({
+            "depth": iteration["depth"],
+            "nodes": iteration["nodes"],
+            "time": iteration["time"],
+            "nps": iteration["nodes"] / iteration["time"] if iteration["time"] > 0 else 0,
+            "value": iteration["value"],
+            "move": None if move is None else "%s%d%s%d" % (move[0] + move[1])
+        })
+    return iterations
+
+'''
+Runs the perft and search benchmarks and the window check on every position, returns the results as a JSON-ready dict
+'''
+def run(positions: dict = POSITIONS, perft_depth: int = PERFT_DEPTH, search_depth: int = SEARCH_DEPTH,
+        null_move: bool = NULL_MOVE_PRUNING, late_move_reductions: bool = LATE_MOVE_REDUCTIONS, futility: bool = FUTILITY_PRUNING,
+        threat_cache_entries: int = THREAT_CACHE_ENTRIES):
+    results = {}
+    total_nodes = 0
+    total_time = 0
+    for (name, board) in positions.items():
+        search = search_benchmark(board, search_depth, null_move, late_move_reductions, futility, threat_cache_entries)
+        results[name] = {"perft": perft_benchmark(board, perft_depth), "window_check": window_check(board), "search": search}
+        total_nodes += search[-1]["nodes"]
+        total_time += search[-1]["time"]
+    return {
+        "python": platform.python_version(),
+        "perft_depth": perft_depth,
+        "search_depth": search_depth,
+        "null_move": null_move,
+        "late_move_reductions": late_move_reductions,
+        "futility": futility,
+        "threat_cache_entries": threat_cache_entries,
+        "positions": results,
+        "total": {"nodes": total_nodes, "time": total_time, "nps": total_nodes / total_time if total_time > 0 else 0}
+    }
+
+'''
+@param previous Results of an earlier run
+@param current Results of this run
+@param tolerance Fraction of nodes/sec a position may lose before it is reported
+
+Returns (regressions, changes): perft counts that differ and a total nodes/sec that dropped by
+more than tolerance, and searches that visited a different number of nodes, chose another move,
+or were slower on one position (single positions search too briefly to time reliably)
+'''
+def compare(previous: dict, current: dict, tolerance: float = NPS_TOLERANCE):
+    regressions = []
+    changes = []
+    for (name, result) in current["positions"].items():
+        if name not in previous["positions"]:
+            continue
+        before = previous["positions"][name]
+        for (depth, count) in result["perft"]["counts"].items():
+            if depth in before["perft"]["counts"] and before["perft"]["counts"][depth] != count:
+                regressions.append("%s: perft %s is %d, was %d" % (name, depth, count, before["perft"]["counts"][depth]))
+        for (old, new) in zip(before["search"], result["search"]):
+            if old["nodes"] != new["nodes"] or old["move"] != new["move"]:
+                changes.append("%s: depth %d searched %d nodes for %s, was %d nodes for %s"
+                               % (name, new["depth"], new["nodes"], new["move"], old["nodes"], old["move"]))
+        old_nps = before["search"][-1]["nps"]
+        new_nps = result["search"][-1]["nps"]
+        if new_nps < old_nps * (1 - tolerance):
+            changes.append("%s: %.0f nodes/sec, was %.0f" % (name, new_nps, old_nps))
+    same_positions = set(previous["positions"]) == set(current["positions"])
+    if same_positions and current["total"]["nps"] < previous["total"]["nps"] * (1 - tolerance):
+        regressions.append("%.0f nodes/sec in total, was %.0f" % (current["total"]["nps"], previous["total"]["nps"]))
+    return regressions, changes
+
+def main(argv: list = None):
+    parser = argparse.ArgumentParser(description="Perft and search benchmark of AB.py")
+    parser.add_argument("--perft-depth", type=int, default=PERFT_DEPTH)
+    parser.add_argument("--search-depth", type=int, default=SEARCH_DEPTH)
+    parser.add_argument("--positions", nargs="+", choices=sorted(POSITIONS), help="Positions to run, all by default")
+    parser.add_argument("--output", help="File to write the JSON results to, stdout by default")
+    parser.add_argument("--compare", help="JSON results of an earlier run to check this run against")
+    parser.add_argument("--tolerance", type=float, default=NPS_TOLERANCE)
+    parser.add_argument("--no-null-move", dest="null_move", action="store_false", help="Search without null-move pruning")
+    parser.add_argument("--no-lmr", dest="late_move_reductions", action="store_false", help="Search without late move reductions")
+    parser.add_argument("--futility", action=argparse.BooleanOptionalAction, default=FUTILITY_PRUNING, help="Search with futility pruning")
+    parser.add_argument("--threat-cache", type=int, default=THREAT_CACHE_ENTRIES, help="Positions in the threat cache, 0 for none")
+    args = parser.parse_args(argv)
+
+    positions = POSITIONS if args.positions is None else {name: POSITIONS[name] for name in args.positions}
+    results = run(positions, args.perft_depth, args.search_depth, args.null_move, args.late_move_reductions, args.futility, args.threat_cache)
+    if args.output is None:
+        print(json.dumps(results, indent=2))
+    else:
+        with open(args.output, "w") as output:
+            json.dump(results, output, indent=2)
+
+    if args.compare is not None:
+        with open(args.compare) as previous:
+            regressions, changes = compare(json.load(previous), results, args.tolerance)
+        for change in changes:
+            print("changed:", change, file=sys.stderr)
+        for regression in regressions:
+            print("regression:", regression, file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,76 @@
+import argparse
+import os
+import sys
+
+from AB import BitBoard, GameBoard, Geometry, OpeningBook, starting_pieces, BOOK_PATH, MIN
+from batch import analyse_batch, format_square, parse_square
+
+# White moves of every line the book covers
+BOOK_MOVES = 3
+# Depth of the search that chooses each book move
+BOOK_DEPTH = 7
+
+'''
+@param board Dictionary of the starting position
+@param moves Number of White moves of every line
+@param depth Depth of the search of every position
+@param workers Number of processes searching, see batch.analyse_batch
+
+Returns the book entries of every position with White to move reached from board by book
+moves of White and any reply of Black, as a dictionary of Zobrist hash to
+(start square, end square, depth, value)
+'''
+def build(board: dict = starting_pieces, moves: int = BOOK_MOVES, depth: int = BOOK_DEPTH, geometry: Geometry = None,
+          workers: int = os.cpu_count() or 1, log = sys.stderr):
+    geometry = geometry if geometry is not None else Geometry.default()
+    entries = {}
+    frontier = {BitBoard(board, geometry).hash: board}
+    for level in range(moves):
+        tasks = [{"id": key, "rows": geometry.rows, "cols": geometry.cols,
+                  "board": {format_square(pos): list(piece_info) for (pos, piece_info) in position.items()}}
+                 for (key, position) in frontier.items() if key not in entries]
+        next_frontier = {}
+        for result in analyse_batch(tasks, workers, limits={"time_limit": None, "max_depth": depth}):
+            if result.get("move") is None:
+                continue # The game is over
+            gameboard = GameBoard(BitBoard(frontier[result["id"]], geometry))
+            move = (geometry.squares[parse_square(result["move"][0])], geometry.squares[parse_square(result["move"][1])])
+            entries[result["id"]] = (move[0], move[1], result["depth"], result["value"])
+            gameboard.make_move(move, 0, False)
+            if gameboard.is_terminal(MIN):
+                continue
+            for reply in list(gameboard.actions(MIN)):
+                gameboard.make_move(reply, 0, True)
+                if not gameboard.is_terminal_game:
+                    next_frontier[gameboard.bitboard.hash] = gameboard.board
+                gameboard.unmake_move()
+        if log is not None:
+            print("move %d: %d positions, %d in the book" % (level + 1, len(tasks), len(entries)), file=log)
+        frontier = next_frontier
+    return entries
+
+'''
+Writes entries of build to path in the format of OpeningBook
+'''
+def write(path: str, entries: dict, geometry: Geometry):
+    if geometry.size > 256:
+        raise ValueError("the opening book file format holds squares up to 255")
+    with open(path, "wb") as book_file:
+        book_file.write(OpeningBook.HEADER.pack(OpeningBook.MAGIC, OpeningBook.VERSION, geometry.rows, geometry.cols, len(entries)))
+        for key in sorted(entries):
+            start, end, depth, value = entries[key]
+            book_file.write(OpeningBook.ENTRY.pack(key, start, end, min(depth, 255), value))
+
+def main(argv: list = None):
+    parser = argparse.ArgumentParser(description="Builds the opening book AB.py plays from, starting from starting_pieces")
+    parser.add_argument("--moves", type=int, default=BOOK_MOVES, help="White moves of every line")
+    parser.add_argument("--depth", type=int, default=BOOK_DEPTH, help="Depth of the search of every position")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--output", default=BOOK_PATH)
+    args = parser.parse_args(argv)
+    geometry = Geometry.default()
+    write(args.output, build(starting_pieces, args.moves, args.depth, geometry, args.workers), geometry)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
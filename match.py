@@ -0,0 +1,311 @@
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from AB import BitBoard, Engine, EvaluationWeights, GameBoard, Geometry, OpeningBook, SearchLimits, SearchStats, Tablebase, \
+    load_config, starting_pieces, MAX, MIN, KING, FIFTY_MOVES, WHITE_STRING, MAX_SEARCH_DEPTH
+
+BLACK_STRING = "Black"
+
+# Seconds per move of an engine that does not set its own limits
+MATCH_TIME_LIMIT = 0.1
+# Games longer than this many plies are drawn, the fifty move rule ends games well before
+MAX_GAME_PLIES = 1000
+# z of the two-sided 95% confidence interval of the Elo difference
+CONFIDENCE_Z = 1.96
+
+# Options of an engine configuration and how their values are read
+ENGINE_OPTIONS = {
+    "time_limit": float,
+    "node_limit": int,
+    "max_depth": int,
+    "table_mb": float,
+    "threat_cache_entries": int,
+    "null_move": bool,
+    "late_move_reductions": bool,
+    "futility": bool,
+    "book": bool,
+    "tablebase": bool,
+    "material": float,
+    "threat": float,
+    "mobility": float
+}
+
+'''
+@param spec Configuration such as "fast:time_limit=0.05,null_move=false", the name before the colon
+            is optional and the options are those of ENGINE_OPTIONS, "none" for no limit
+
+Returns (name, options)
+'''
+def parse_engine(spec: str):
+    name, _, settings = spec.partition(":") if ":" in spec else ("", "", spec)
+    options = {}
+    for setting in settings.split(","):
+        if not setting.strip():
+            continue
+        key, _, value = setting.partition("=")
+        key = key.strip()
+        value = value.strip()
+        if key not in ENGINE_OPTIONS:
+            raise ValueError("unknown engine option %s, expected one of %s" % (key, ", ".join(ENGINE_OPTIONS)))
+        if value.lower() == "none":
+            options[key] = None
+        elif ENGINE_OPTIONS[key] is bool:
+            if value.lower() not in ("true", "false", "1", "0"):
+                raise ValueError("%s must be true or false, not %s" % (key, value))
+            options[key] = value.lower() in ("true", "1")
+        else:
+            options[key] = ENGINE_OPTIONS[key](value)
+    return name.strip() or spec, options
+
+'''
+Returns a new Engine with options, see parse_engine
+'''
+def make_engine(options: dict, geometry: Geometry):
+    limits = SearchLimits(options.get("time_limit", MATCH_TIME_LIMIT), options.get("node_limit"),
+                          options.get("max_depth", MAX_SEARCH_DEPTH) or MAX_SEARCH_DEPTH)
+    defaults = EvaluationWeights()
+    weights = EvaluationWeights(options.get("material", defaults.material), options.get("threat", defaults.threat),
+                                options.get("mobility", defaults.mobility), defaults.win, defaults.draw)
+    engine_options = {key: options[key] for key in ("null_move", "late_move_reductions", "futility", "table_mb", "threat_cache_entries") if key in options}
+    return Engine(geometry, weights, limits, tablebase=Tablebase.open() if options.get("tablebase") else None,
+                  book=OpeningBook.open() if options.get("book") else None, **engine_options)
+
+'''
+Returns board turned upside down with the colors swapped, so that Black's side of the position
+becomes White's. Engine searches with White to move, so Black moves are searched on the mirror
+'''
+def mirror(board: dict, rows: int):
+    return {(pos[0], rows - 1 - pos[1]): (piece_type, BLACK_STRING if color == WHITE_STRING else WHITE_STRING)
+            for (pos, (piece_type, color)) in board.items()}
+
+def mirror_move(move: tuple, rows: int):
+    return tuple((pos[0], rows - 1 - pos[1]) for pos in move)
+
+'''
+Returns None while the game goes on with player to move, otherwise (score of White, reason):
+1 if White won, 0 if Black won, 0.5 for a draw, by the rules in AB.py
+'''
+def game_result(gameboard: GameBoard, player: bool, num_moves_without_capture: int):
+    pieces = gameboard.bitboard.pieces
+    if not pieces[True][KING]:
+        return 1, "King captured"
+    if not pieces[False][KING]:
+        return 0, "King captured"
+    checkmate = gameboard.checkmate_status()
+    if checkmate != 0:
+        return (1 if checkmate == 1 else 0), "checkmate"
+    if num_moves_without_capture >= FIFTY_MOVES:
+        return 0.5, "fifty moves without a capture"
+    if not gameboard.has_moves(player):
+        return 0.5, "no moves"
+    return None
+
+'''
+@param task Game to play: the "white" and "black" (name, options), the "opening" name, its
+            "board", "rows" and "cols", and "random_plies" random moves played first with "seed"
+
+Plays one game to the end and returns it as a JSON-ready dict with the score of White and the
+moves, seconds and nodes each side searched
+'''
+def play_game(task: dict):
+    geometry = Geometry.of(task["rows"], task["cols"])
+    gameboard = GameBoard(BitBoard(task["board"], geometry))
+    sides = {MAX: task["white"], MIN: task["black"]}
+    engines = {player: make_engine(options, geometry) for (player, (name, options)) in sides.items()}
+    totals = {player: {"moves": 0, "time": 0, "nodes": 0} for player in sides}
+    player = MAX
+    num_moves_without_capture = 0
+    plies = 0
+    moves = []
+
+    rng = random.Random(task["seed"])
+    while plies < task["random_plies"] and game_result(gameboard, player, num_moves_without_capture) is None:
+        move = rng.choice(list(gameboard.actions(player)))
+        num_moves_without_capture = gameboard.make_move(move, num_moves_without_capture, player is MIN)
+        moves.append("%s%d%s%d" % (geometry.positions[move[0]] + geometry.positions[move[1]]))
+        player = not player
+        plies += 1
+
+    while True:
+        result = game_result(gameboard, player, num_moves_without_capture)
+        if result is not None:
+            break
+        if plies >= MAX_GAME_PLIES:
+            result = (0.5, "longer than %d plies" % MAX_GAME_PLIES)
+            break
+        board = gameboard.board if player is MAX else mirror(gameboard.board, geometry.rows)
+        started = time.perf_counter()
+        move, stats = engines[player].search(board, stats=SearchStats())
+        totals[player]["time"] += time.perf_counter() - started
+        totals[player]["nodes"] += stats.nodes
+        totals[player]["moves"] += 1
+        if move is not None and player is MIN:
+            move = mirror_move(move, geometry.rows)
+        squares = None if move is None else (geometry.squares.get(move[0]), geometry.squares.get(move[1]))
+        if squares is None or not gameboard.is_legal_move(squares, player):
+            result = ((0 if player is MAX else 1), "%s played an illegal move %s" % (sides[player][0], move))
+            break
+        num_moves_without_capture = gameboard.make_move(squares, num_moves_without_capture, player is MIN)
+        moves.append("%s%d%s%d" % (move[0] + move[1]))
+        player = not player
+        plies += 1
+
+    return {
+        "white": sides[MAX][0],
+        "black": sides[MIN][0],
+        "opening": task["opening"],
+        "seed": task["seed"],
+        "result": result[0],
+        "reason": result[1],
+        "plies": plies,
+        "moves": moves,
+        "white_stats": totals[MAX],
+        "black_stats": totals[MIN]
+    }
+
+'''
+@param engines (name, options) of every configuration, each pair plays
+@param openings Dictionary of opening name to (board, rows, cols)
+@param games Number of game pairs per opening and pair of engines, each pair is played once with each color
+@param random_plies Random moves played before the engines take over, the same for both games of a pair
+
+Returns the task of every game, see play_game
+'''
+def match_tasks(engines: list, openings: dict, games: int = 1, random_plies: int = 0, seed: int = 0):
+    tasks = []
+    for i in range(len(engines)):
+        for j in range(i + 1, len(engines)):
+            for (opening, (board, rows, cols)) in openings.items():
+                for game in range(games):
+                    game_seed = seed + len(tasks)
+                    for (white, black) in ((engines[i], engines[j]), (engines[j], engines[i])):
+                        tasks.append({"white": white, "black": black, "opening": opening, "board": board, "rows": rows,
+                                      "cols": cols, "random_plies": random_plies, "seed": game_seed})
+    return tasks
+
+'''
+Yields the result of every task as its game ends, in the order of tasks, played by workers processes
+'''
+def play_games(tasks: list, workers: int = os.cpu_count() or 1):
+    if workers <= 1:
+        for task in tasks:
+            yield play_game(task)
+        return
+    with ProcessPoolExecutor(workers) as executor:
+        yield from executor.map(play_game, tasks)
+
+'''
+Returns the Elo difference of a score, the fraction of the points won, infinite at 0 and 1
+'''
+def elo(score: float):
+    if score <= 0:
+        return float('-inf')
+    if score >= 1:
+        return float('inf')
+    return 400 * math.log10(score / (1 - score))
+
+'''
+@param points Points of one side in each game, 1, 0.5 or 0
+
+Returns (Elo difference, lower bound, upper bound) of the confidence interval, from the normal
+approximation of the mean score of the games
+'''
+def elo_interval(points: list):
+    n = len(points)
+    score = sum(points) / n
+    deviation = math.sqrt(sum((point - score) ** 2 for point in points) / n)
+    margin = CONFIDENCE_Z * deviation / math.sqrt(n)
+    return elo(score), elo(score - margin), elo(score + margin)
+
+'''
+Returns the summary of games as a JSON-ready dict: for every pair of engines the wins, losses
+and draws of the first and its Elo difference over the second, and for every engine the
+average seconds and nodes per move
+'''
+def summarize(engines: list, games: list):
+    names = [name for (name, options) in engines]
+    pairs = []
+    for i in range(len(names)):
+        for j in range(i + 1, len(names)):
+            points = []
+            for game in games:
+                if (game["white"], game["black"]) == (names[i], names[j]):
+                    points.append(game["result"])
+                elif (game["white"], game["black"]) == (names[j], names[i]):
+                    points.append(1 - game["result"])
+            if not points:
+                continue
+            difference, lower, upper = elo_interval(points)
+            pairs.append({"engine": names[i], "opponent": names[j], "games": len(points),
+                          "wins": points.count(1), "losses": points.count(0), "draws": points.count(0.5),
+                          "score": sum(points) / len(points), "elo": difference, "elo_lower": lower, "elo_upper": upper})
+
+    engine_totals = {name: {"moves": 0, "time": 0, "nodes": 0} for name in names}
+    for game in games:
+        for (color, stats) in (("white", game["white_stats"]), ("black", game["black_stats"])):
+            for key in ("moves", "time", "nodes"):
+                engine_totals[game[color]][key] += stats[key]
+    per_engine = {name: {"moves": totals["moves"],
+                         "time_per_move": totals["time"] / totals["moves"] if totals["moves"] else 0,
+                         "nodes_per_move": totals["nodes"] / totals["moves"] if totals["moves"] else 0}
+                  for (name, totals) in engine_totals.items()}
+    return {"pairs": pairs, "engines": per_engine}
+
+def format_summary(summary: dict):
+    lines = []
+    for pair in summary["pairs"]:
+        lines.append("%s vs %s: +%d -%d =%d of %d, score %.1f%%, Elo %+.1f (%+.1f, %+.1f)"
+                     % (pair["engine"], pair["opponent"], pair["wins"], pair["losses"], pair["draws"], pair["games"],
+                        100 * pair["score"], pair["elo"], pair["elo_lower"], pair["elo_upper"]))
+    for (name, totals) in summary["engines"].items():
+        lines.append("%s: %d moves, %.3fs and %.0f nodes per move" % (name, totals["moves"], totals["time_per_move"], totals["nodes_per_move"]))
+    return "\n".join(lines)
+
+def main(argv: list = None):
+    parser = argparse.ArgumentParser(description="Plays engine configurations of AB.py against each other and estimates their Elo difference")
+    parser.add_argument("--engine", action="append", default=[], help='Engine configuration, e.g. "fast:time_limit=0.05,null_move=false" '
+                        "(options: %s), give at least two" % ", ".join(ENGINE_OPTIONS))
+    parser.add_argument("--config", nargs="*", default=[], help="Files in the format of config.txt to play from as well as starting_pieces")
+    parser.add_argument("--games", type=int, default=1, help="Game pairs, one with each color, per opening and pair of engines")
+    parser.add_argument("--random-plies", type=int, default=0, help="Random moves played before the engines take over")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Games played at once, time limits are per process")
+    parser.add_argument("--output", help="File to write one JSON line per game to")
+    args = parser.parse_args(argv)
+
+    engines = [parse_engine(spec) for spec in args.engine]
+    if len(engines) < 2:
+        parser.error("give at least two --engine configurations")
+    if len(set(name for (name, options) in engines)) < len(engines):
+        parser.error("engine configurations need different names")
+    geometry = Geometry.default()
+    openings = {"starting_pieces": (starting_pieces, geometry.rows, geometry.cols)}
+    for path in args.config:
+        config_geometry, board = load_config(path)
+        openings[path] = (board, config_geometry.rows, config_geometry.cols)
+
+    games = []
+    output = None if args.output is None else open(args.output, "w")
+    try:
+        for game in play_games(match_tasks(engines, openings, args.games, args.random_plies, args.seed), args.workers):
+            games.append(game)
+            print("%s - %s (%s): %s, %s after %d plies" % (game["white"], game["black"], game["opening"],
+                                                          {1: "1-0", 0: "0-1", 0.5: "1/2-1/2"}[game["result"]], game["reason"], game["plies"]),
+                  file=sys.stderr)
+            if output is not None:
+                output.write(json.dumps(game) + "\n")
+                output.flush()
+    finally:
+        if output is not None:
+            output.close()
+    print(format_summary(summarize(engines, games)))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
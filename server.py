@@ -0,0 +1,158 @@
+import argparse
+import json
+import sys
+import threading
+import time
+
+from AB import BitBoard, Engine, GameBoard, OpeningBook, SearchLimits, SearchStats, Tablebase, \
+    MAX, SEARCH_TIME_LIMIT, MAX_SEARCH_DEPTH, TRANSPOSITION_TABLE_MB, WHITE_STRING
+from batch import format_square, read_limit, read_position
+from match import BLACK_STRING, mirror, mirror_move
+
+class Server:
+    '''
+    @param engine Engine that searches every position, it keeps what it learns between requests
+    @param output File the responses are written to, one JSON object per line
+    @param ponder Whether to search the position expected next while waiting for the next request
+
+    Serves the line protocol of main(). Searches run one at a time on a worker thread, so that
+    requests, stop in particular, are read while a search runs. After answering a go request the
+    worker ponders: it searches the position after the best move and the reply the principal
+    variation expects, without a limit, until the next request stops it. The transposition table
+    then holds that position searched, so the next search starts from a warm tree.
+    '''
+    def __init__(self, engine: Engine, output = sys.stdout, ponder: bool = True):
+        self.engine = engine
+        self.output = output
+        self.ponder = ponder
+        self.output_lock = threading.Lock()
+        self.thread = None
+        self.stop_event = None
+        # Hash of the position pondered on, as the engine sees it with White to move
+        self.ponder_hash = None
+
+    def write(self, response: dict):
+        with self.output_lock:
+            self.output.write(json.dumps(response) + "\n")
+            self.output.flush()
+
+    '''
+    Stops the search or pondering of the worker thread, if any, and waits for it to end
+    '''
+    def stop(self):
+        if self.thread is not None:
+            self.stop_event.set()
+            self.thread.join()
+            self.thread = None
+
+    '''
+    Handles one request, returns False if it asks the server to quit
+    '''
+    def handle(self, request: dict):
+        command = request.get("cmd")
+        if command == "go":
+            self.stop()
+            try:
+                geometry, board = read_position(request)
+                is_black = request.get("color", WHITE_STRING) == BLACK_STRING
+                if is_black:
+                    board = mirror(board, geometry.rows)
+                defaults = self.engine.limits
+                limits = SearchLimits(read_limit(request, "time_limit", defaults.time_limit), read_limit(request, "node_limit", defaults.node_limit, True),
+                                      read_limit(request, "max_depth", defaults.max_depth, True))
+            except ValueError as error:
+                self.write({"id": request.get("id"), "error": str(error)})
+                return True
+            gameboard = GameBoard(BitBoard(board, geometry), self.engine.weights, self.engine.threat_cache)
+            self.stop_event = threading.Event()
+            self.thread = threading.Thread(target=self.go, args=(request.get("id"), gameboard, is_black, limits, self.stop_event), daemon=True)
+            self.thread.start()
+        elif command == "stop":
+            self.stop()
+        elif command == "new":
+            self.stop()
+            self.engine.clear()
+            self.ponder_hash = None
+        elif command == "ping":
+            self.write({"id": request.get("id"), "pong": True})
+        elif command == "quit":
+            self.stop()
+            return False
+        else:
+            self.write({"id": request.get("id"), "error": "unknown command %r" % (command,)})
+        return True
+
+    '''
+    Searches gameboard, with White to move, and writes the move found, or the error the search raised, then ponders until stop is set
+    '''
+    def go(self, id, gameboard: GameBoard, is_black: bool, limits: SearchLimits, stop: threading.Event):
+        try:
+            started = time.perf_counter()
+            ponder_hit = gameboard.bitboard.hash == self.ponder_hash
+            move, stats = self.engine.search(gameboard, limits, SearchStats(), stop)
+            positions = gameboard.bitboard.geometry.positions
+            expected = self.engine.principal_variation
+            reply = None if len(expected) < 2 else (positions[expected[1][0]], positions[expected[1][1]])
+            if is_black:
+                move = None if move is None else mirror_move(move, gameboard.bitboard.geometry.rows)
+                reply = None if reply is None else mirror_move(reply, gameboard.bitboard.geometry.rows)
+            response = {"id": id, "move": None if move is None else [format_square(move[0]), format_square(move[1])]}
+            if stats.iterations:
+                response["depth"] = stats.iterations[-1]["depth"]
+                response["value"] = stats.iterations[-1]["value"]
+            response["nodes"] = stats.nodes
+            response["time"] = time.perf_counter() - started
+            response["ponder_hit"] = ponder_hit
+            response["expected_reply"] = None if reply is None else [format_square(reply[0]), format_square(reply[1])]
+            self.write(response)
+        except Exception as error:
+            self.ponder_hash = None
+            self.write({"id": id, "error": "%s: %s" % (type(error).__name__, error)})
+            return
+
+        self.ponder_hash = None
+        if self.ponder and len(expected) >= 2 and not stop.is_set():
+            gameboard.make_move(expected[0], 0, False)
+            gameboard.make_move(expected[1], 0, True)
+            if gameboard.is_terminal_game or not gameboard.has_moves(MAX):
+                return
+            self.ponder_hash = gameboard.bitboard.hash
+            self.engine.search(gameboard, SearchLimits(None, None, MAX_SEARCH_DEPTH), None, stop)
+
+def main(argv: list = None):
+    parser = argparse.ArgumentParser(description="Serves AB.py searches over stdin/stdout, one JSON request and response per line. "
+                                     'Requests: {"cmd": "go", "board": {"e4": ["King", "Black"], ...}} with optionally an "id", '
+                                     'the "rows" and "cols", the "color" to move and a "time_limit", "node_limit" or "max_depth"; '
+                                     '{"cmd": "stop"} to answer the running go at once; {"cmd": "new"} before a new game; '
+                                     '{"cmd": "ping"}; {"cmd": "quit"}')
+    parser.add_argument("--time-limit", type=float, default=SEARCH_TIME_LIMIT, help="Seconds per move of a go without a time_limit, 0 for none")
+    parser.add_argument("--table-mb", type=float, default=TRANSPOSITION_TABLE_MB)
+    parser.add_argument("--no-ponder", dest="ponder", action="store_false", help="Wait idle between requests")
+    parser.add_argument("--no-book", dest="book", action="store_false", help="Search positions of the opening book too")
+    parser.add_argument("--no-tablebase", dest="tablebase", action="store_false", help="Search without the endgame tablebase")
+    args = parser.parse_args(argv)
+
+    engine = Engine(limits=SearchLimits(args.time_limit or None), table_mb=args.table_mb,
+                    tablebase=Tablebase.open() if args.tablebase else None, book=OpeningBook.open() if args.book else None)
+    server = Server(engine, sys.stdout, args.ponder)
+    try:
+        for line in sys.stdin:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                request = json.loads(line)
+            except ValueError as error:
+                server.write({"error": "not JSON: %s" % error})
+                continue
+            if not isinstance(request, dict):
+                server.write({"error": "not a JSON object"})
+                continue
+            if not server.handle(request):
+                break
+    finally:
+        server.stop()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
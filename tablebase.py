@@ -0,0 +1,194 @@
+import argparse
+import itertools
+import sys
+import time
+
+from AB import BitBoard, GameBoard, Geometry, Tablebase, MAX, MIN, KING, PIECE_TYPES, FIFTY_MOVES, TABLEBASE_PATH, PIECE_STRINGS
+
+DEFAULT_MAX_PIECES = 3
+
+'''
+@param max_pieces Largest number of pieces, Kings included
+@param geometry Geometry of the board
+
+Returns the piece sets of the tablebase, fewest pieces first, as Tablebase.piece_set keys.
+Each color has its King, at most one Queen, Rook, Bishop and Knight, and at most cols Pawns
+'''
+def piece_sets(max_pieces: int, geometry: Geometry):
+    # Most pieces of each code a color can have, there is no promotion
+    most = [geometry.cols, 1, 1, 1, 1, 0]
+    color_sets = [counts for counts in itertools.product(*[range(limit + 1) for limit in most])
+                  if sum(counts) <= max_pieces - 2]
+    sets = []
+    for (white, black) in itertools.product(color_sets, color_sets):
+        if sum(white) + sum(black) <= max_pieces - 2:
+            white = list(white)
+            black = list(black)
+            white[KING] = 1
+            black[KING] = 1
+            sets.append(bytes(white + black))
+    sets.sort(key=sum)
+    return sets
+
+'''
+Returns the (is_black, piece code) of every piece of the piece set, in the order of Tablebase.position_index
+'''
+def set_pieces(piece_set: bytes):
+    pieces = []
+    for (i, count) in enumerate(piece_set):
+        pieces.extend([(i >= len(PIECE_TYPES), i % len(PIECE_TYPES))] * count)
+    return pieces
+
+def set_name(piece_set: bytes):
+    names = []
+    for (i, count) in enumerate(piece_set):
+        if count:
+            names.append("%s%s%s" % ("Black " if i >= len(PIECE_TYPES) else "White ", PIECE_STRINGS[i % len(PIECE_TYPES)],
+                                     " x%d" % count if count > 1 else ""))
+    return ", ".join(names)
+
+'''
+Yields a BitBoard for every placement of pieces on distinct squares, pieces of the same color
+and type on increasing squares so that each position comes once
+'''
+def placements(pieces: list, geometry: Geometry):
+    for squares in itertools.permutations(range(geometry.size), len(pieces)):
+        if any(pieces[i] == pieces[i + 1] and squares[i] > squares[i + 1] for i in range(len(pieces) - 1)):
+            continue
+        bitboard = BitBoard(None, geometry)
+        for ((is_black, piece_type), sq) in zip(pieces, squares):
+            bitboard.pieces[is_black][piece_type] |= 1 << sq
+            bitboard.occupancy[is_black] |= 1 << sq
+            bitboard.squares[sq] = piece_type
+        yield bitboard
+
+'''
+Returns the outcome for player to move on gameboard right after a capture: 1 if player wins,
+-1 if player loses, 0 for a draw, looked up in the finished tables of smaller piece sets
+'''
+def outcome_after_capture(gameboard: GameBoard, player: bool, tables: dict):
+    if gameboard.is_terminal_game:
+        return 1 if bool(gameboard.bitboard.pieces[False][KING]) == (player is MAX) else -1
+    checkmate = gameboard.checkmate_status()
+    if checkmate != 0:
+        return checkmate if player is MAX else -checkmate
+    if not gameboard.has_moves(player):
+        return 0
+    bitboard = gameboard.bitboard
+    table = tables[Tablebase.piece_set(bitboard)]
+    index = Tablebase.position_index(bitboard)
+    if player is MIN:
+        index += len(table) // 2
+    entry = table[index]
+    if entry == 0:
+        return 0
+    return 1 if entry < Tablebase.LOSS else -1
+
+'''
+Solves one piece set by retrograde analysis and returns its table, the Tablebase bytes of every
+position with White to move followed by every position with Black to move.
+
+Every position starts from what its captures lead to (positions of smaller piece sets that are
+already solved) and checkmates, then results spread backwards through the quiet moves one move
+at a time: a position is won in d + 1 moves if a quiet move leads to a position lost in d, and
+lost in d + 1 if every move leads to a position won for the other side, d + 1 being the largest.
+Results further than FIFTY_MOVES moves from a capture are draws under the fifty move rule.
+'''
+def solve(piece_set: bytes, geometry: Geometry, tables: dict):
+    pieces = set_pieces(piece_set)
+    count = geometry.size ** len(pieces)
+    table = bytearray(2 * count)
+    outcomes = {}
+    remaining = {}
+    drawing = set()
+    predecessors = {}
+    layers = [[] for d in range(FIFTY_MOVES + 2)]
+
+    def resolve(node: int, outcome: int, distance: int):
+        outcomes[node] = outcome
+        if distance > 0:
+            table[node] = (Tablebase.WIN if outcome == 1 else Tablebase.LOSS) + distance
+        layers[distance].append(node)
+
+    for bitboard in placements(pieces, geometry):
+        gameboard = GameBoard(bitboard)
+        index = Tablebase.position_index(bitboard)
+        checkmate = gameboard.checkmate_status()
+        for player in (MAX, MIN):
+            node = index if player is MAX else count + index
+            child_offset = count if player is MAX else 0
+            if checkmate != 0:
+                resolve(node, checkmate if player is MAX else -checkmate, 0)
+                continue
+            is_black = player is MIN
+            wins = False
+            quiet_moves = 0
+            for move in list(gameboard.actions(player)):
+                is_capture = gameboard.bitboard.occupancy[not is_black] & (1 << move[1])
+                gameboard.make_move(move, 0, is_black)
+                if is_capture:
+                    outcome = outcome_after_capture(gameboard, not player, tables)
+                    wins = wins or outcome == -1
+                    if outcome == 0:
+                        drawing.add(node)
+                else:
+                    child = child_offset + Tablebase.position_index(gameboard.bitboard)
+                    predecessors.setdefault(child, []).append(node)
+                    quiet_moves += 1
+                gameboard.unmake_move()
+            if wins:
+                resolve(node, 1, 1)
+            elif quiet_moves:
+                remaining[node] = quiet_moves
+            elif node not in drawing and gameboard.has_moves(player):
+                resolve(node, -1, 1) # Every move is a capture that loses
+            else:
+                outcomes[node] = 0 # Draw, no moves or a capture that draws
+
+    for distance in range(FIFTY_MOVES):
+        for node in layers[distance]:
+            lost = outcomes[node] == -1
+            for parent in predecessors.get(node, ()):
+                if parent in outcomes:
+                    continue
+                if lost:
+                    resolve(parent, 1, distance + 1)
+                else:
+                    remaining[parent] -= 1
+                    if remaining[parent] == 0 and parent not in drawing:
+                        resolve(parent, -1, distance + 1)
+    return table
+
+'''
+Solves every piece set of at most max_pieces pieces and writes the tablebase to path
+'''
+def generate(path: str = TABLEBASE_PATH, max_pieces: int = DEFAULT_MAX_PIECES, geometry: Geometry = None, log = sys.stderr):
+    geometry = geometry if geometry is not None else Geometry.default()
+    if geometry.rows > 255 or geometry.cols > 255 or max_pieces > 255:
+        raise ValueError("the tablebase file format holds at most 255 rows, columns and pieces")
+    tables = {}
+    for piece_set in piece_sets(max_pieces, geometry):
+        started = time.perf_counter()
+        tables[piece_set] = solve(piece_set, geometry, tables)
+        if log is not None:
+            print("%s: %.1fs" % (set_name(piece_set), time.perf_counter() - started), file=log)
+
+    offset = Tablebase.HEADER.size + len(tables) * Tablebase.DIRECTORY_ENTRY.size
+    with open(path, "wb") as tablebase_file:
+        tablebase_file.write(Tablebase.HEADER.pack(Tablebase.MAGIC, Tablebase.VERSION, geometry.rows, geometry.cols, max_pieces, len(tables)))
+        for (piece_set, table) in tables.items():
+            tablebase_file.write(Tablebase.DIRECTORY_ENTRY.pack(piece_set, offset))
+            offset += len(table)
+        for table in tables.values():
+            tablebase_file.write(table)
+
+def main(argv: list = None):
+    parser = argparse.ArgumentParser(description="Generates the endgame tablebase AB.py probes during search")
+    parser.add_argument("--max-pieces", type=int, default=DEFAULT_MAX_PIECES, help="Largest number of pieces, Kings included")
+    parser.add_argument("--output", default=TABLEBASE_PATH)
+    args = parser.parse_args(argv)
+    generate(args.output, args.max_pieces)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())